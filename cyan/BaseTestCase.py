@@ -1,14 +1,24 @@
 import unittest
-from . import nav
+from . import common, nav
 
 
 class BaseTestCase(unittest.TestCase):
-    def setUp(self):
-        pass
+    # Set to a pool.BrowserPool to run each test on a browser borrowed from the pool
+    browser_pool = None
 
-    def tearDown(self):
-        pass
+    def setUp(self):
+        if self.browser_pool:
+            lease = self.browser_pool.lease()
+            lease.__enter__()
+            # cleanups run even when a subclass' setUp fails, unlike tearDown
+            self.addCleanup(lease.__exit__, None, None, None)
 
     @classmethod
     def tearDownClass(cls):
-        nav.quit_browser()
\ No newline at end of file
+        if cls.browser_pool:
+            return
+
+        if common.keep_browser:
+            nav.reset_browser()
+        else:
+            nav.quit_browser()
\ No newline at end of file
@@ -1,3 +1,5 @@
+import threading
+import time
 from enum import Enum
 
 site_url = r'http://localhost:88/'
@@ -7,6 +9,149 @@ connection_string = ""
 browser = None  # webdriver.Chrome(driver_path)
 checking = False
 indexing = False
+screenshot_dir = './Screenshots'
+keep_browser = False  # reuse the browser across test classes instead of relaunching it
+recycle_after = 10  # test classes a kept browser serves before it's relaunched
+reset_storage = False  # clear cookies and web storage between test classes of a kept browser
+session_snapshot = False  # restore a saved login session instead of logging in through the form
+health_ttl = 5.0  # seconds a probed liveness or login state of a session is trusted
+
+
+class SessionHealth(object):
+    """
+    The probed states of a session ('alive', 'logged'), each trusted for health_ttl seconds.
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def get(self, name: str):
+        """
+        Get a state if it's still fresh.
+
+        :param name: The state name
+        :return: The state value, or None if it was never probed or has expired
+        """
+        state = self._states.get(name)
+
+        if state is None or time.time() - state[1] > health_ttl:
+            return None
+
+        return state[0]
+
+    def set(self, name: str, value):
+        self._states[name] = (value, time.time())
+
+        return value
+
+    def invalidate(self):
+        """
+        Forget all states, to be called on navigation or when the driver raised an error.
+        """
+        self._states = {}
+
+
+class Session(object):
+    """
+    The state of one WebDriver session: the driver itself and its 'checking' flag.
+    """
+
+    def __init__(self, driver=None):
+        self.browser = driver
+        self.checking = False
+        self.classes_run = 0
+        self.user = None
+        self.health = SessionHealth()
+        self.menus = {}
+        self.locators = {}
+        self.batch = None
+
+    def invalidate(self):
+        """
+        Forget what's known of the current page: the probed health states and the cached locators. To be
+        called on navigation or when the driver raised an error.
+        """
+        self.health.invalidate()
+        self.clear_locators()
+
+    def reset(self, logged_out: bool=False):
+        """
+        Forget the state the last test left in the session, before the browser serves another test: what's
+        known of the page, the menus read, a pending batch, and the 'checking' flag.
+
+        :param logged_out: The browser's cookies and storage were cleared, forget the logged in user too
+        """
+        self.invalidate()
+        self.menus = {}
+        self.batch = None
+        self.checking = False
+
+        if logged_out:
+            self.user = None
+
+    def clear_locators(self):
+        """
+        Forget the cached locators, to be called when an action may have replaced the page's elements
+        (a click, a route change).
+        """
+        self.locators = {}
+
+
+class _GlobalSession(Session):
+    """
+    The default session, backed by the module's 'browser' and 'checking' globals, so the
+    single-browser behaviour is kept when no session is bound to the current thread.
+    """
+
+    @property
+    def browser(self):
+        return browser
+
+    @browser.setter
+    def browser(self, value):
+        global browser
+        browser = value
+
+    @property
+    def checking(self):
+        return checking
+
+    @checking.setter
+    def checking(self, value):
+        global checking
+        checking = value
+
+
+_context = threading.local()
+_global_session = _GlobalSession()
+
+
+def get_session() -> Session:
+    """
+    Get the session bound to the current thread, or the global one if none is bound.
+    """
+    return getattr(_context, 'session', None) or _global_session
+
+
+def bind_session(session: Session=None):
+    """
+    Bind a session to the current thread. Passing None restores the global session.
+    """
+    _context.session = session
+
+
+def get_browser():
+    """
+    Get the web driver of the current session.
+    """
+    return get_session().browser
+
+
+def set_browser(driver):
+    """
+    Set the web driver of the current session.
+    """
+    get_session().browser = driver
 
 
 class TextSearchType(Enum):
@@ -24,6 +169,19 @@ class ListFilterType(Enum):
     Name = 5
 
 
+class FieldFilterType(Enum):
+    Label = 1
+    Attribute = 2
+    Css = 3
+    XPath = 4
+
+
+class TextEntryType(Enum):
+    Keys = 1
+    Paste = 2
+    Auto = 3
+
+
 class CursorFetchType(Enum):
     Nothing = 0
     One = 1
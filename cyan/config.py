@@ -0,0 +1,274 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module contains the settings of cyan, read once per process from the project's settings.ini.
+
+    Any setting can be overridden by an environment variable named CYAN_<SECTION>_<KEY>, e.g.
+    CYAN_SITE_SITEURL. Overlays layer a '[<SECTION>:<overlay>]' section of the settings file over the
+    '[<SECTION>]' one, e.g. '[SITE:worker-2]' to give the second test worker its own site url or
+    database. The overlays listed in the CYAN_OVERLAY environment variable (comma separated) are used
+    from the start.
+
+    ---------------------------------------------------------------------
+"""
+
+import configparser
+import os
+import re
+import threading
+
+
+class CyanConfig(object):
+    file_name = ''
+
+    def __init__(self, file_name: str=''):
+        """
+        :param file_name: The settings file path, defaults to the project's settings.ini
+        """
+        self.file_name = file_name or get_config_path()
+        self.overlays = [name.strip() for name in os.environ.get('CYAN_OVERLAY', '').split(',') if name.strip()]
+        self._values = {}
+        self._parser = configparser.ConfigParser()
+        self._parser.read(self.file_name)
+
+    def get(self, section: str, key: str, default: str=None) -> str:
+        """
+        Get a setting, an empty value counts as missing.
+
+        :param section: The settings section
+        :param key: The setting name
+        :param default: Value returned when the setting is missing
+        :return: The setting value
+        """
+        value = os.environ.get('CYAN_%s_%s' % (section.upper(), key.upper()))
+
+        if value:
+            return value
+
+        value = self._values.get((section.upper(), key.lower()))
+
+        if value:
+            return value
+
+        for overlay in reversed(self.overlays):
+            value = self._parser.get('%s:%s' % (section, overlay), key, fallback='')
+
+            if value:
+                return value
+
+        return self._parser.get(section, key, fallback='') or default
+
+    def get_bool(self, section: str, key: str, default: bool=False) -> bool:
+        value = self.get(section, key)
+
+        return default if value is None else value.strip().lower() in ('true', 'yes', '1', 'on')
+
+    def get_int(self, section: str, key: str, default: int=0) -> int:
+        value = self.get(section, key)
+
+        return default if value is None else int(value)
+
+    def get_float(self, section: str, key: str, default: float=0.0) -> float:
+        value = self.get(section, key)
+
+        return default if value is None else float(value)
+
+    def use_overlay(self, name: str):
+        """
+        Layer the '[<SECTION>:<name>]' sections over the settings, the last overlay used wins.
+
+        :param name: The overlay name
+        """
+        if name not in self.overlays:
+            self.overlays.append(name)
+
+    def set(self, section: str, key: str, value):
+        """
+        Override a setting for this process only.
+        """
+        self._values[(section.upper(), key.lower())] = str(value)
+
+    @property
+    def site_url(self) -> str:
+        return self.get('SITE', 'SiteUrl', r'http://localhost/')
+
+    @property
+    def connection_string(self) -> str:
+        return self.get('SITE', 'ConnectionString', r"Driver={SQL Server Native Client 11.0}; "
+                                                    "Server=.; Database=cosacs;uid=sa;pwd=;")
+
+    @property
+    def driver_path(self) -> str:
+        return get_driver_path(self.get('SITE', 'DriverRelPath', r'\drivers\chromedriver.exe'))
+
+    @property
+    def user(self) -> str:
+        return self.get('SITE', 'User', r"user")
+
+    @property
+    def password(self) -> str:
+        return self.get('SITE', 'Pw', r"password")
+
+    @property
+    def session_snapshot(self) -> bool:
+        return self.get_bool('SITE', 'SessionSnapshot')
+
+    @property
+    def auth_url(self) -> str:
+        return self.get('SITE', 'AuthUrl', r"".join([self.site_url, 'Account/Login']))
+
+    @property
+    def auth_user_field(self) -> str:
+        return self.get('SITE', 'AuthUserField', 'username')
+
+    @property
+    def auth_password_field(self) -> str:
+        return self.get('SITE', 'AuthPasswordField', 'password')
+
+    @property
+    def site_version(self) -> str:
+        return self.get('SITE', 'SiteVersion', 'default')
+
+    @property
+    def use_hub(self) -> bool:
+        return self.get_bool('SELENIUM', 'UseHub')
+
+    @property
+    def hub_url(self) -> str:
+        hub_ip = self.get('SELENIUM', 'HubIp', '192.168.30.8')
+        hub_port = self.get('SELENIUM', 'HubPort', '4444')
+
+        return 'http://%s:%s/wd/hub' % (hub_ip, hub_port)
+
+    @property
+    def use_daemon(self) -> bool:
+        return self.get_bool('SELENIUM', 'UseDaemon')
+
+    @property
+    def daemon_url(self) -> str:
+        return self.get('SELENIUM', 'DaemonUrl', 'http://localhost:4455')
+
+    @property
+    def keep_browser(self) -> bool:
+        return self.get_bool('SELENIUM', 'KeepBrowser')
+
+    @property
+    def recycle_after(self) -> int:
+        return self.get_int('SELENIUM', 'RecycleAfter', 10)
+
+    @property
+    def reset_storage(self) -> bool:
+        return self.get_bool('SELENIUM', 'ResetStorage')
+
+    @property
+    def health_ttl(self) -> float:
+        return self.get_float('SELENIUM', 'HealthTtl', 5.0)
+
+    @property
+    def fast_menu(self) -> bool:
+        return self.get_bool('SELENIUM', 'FastMenu')
+
+    @property
+    def soft_navigation(self) -> bool:
+        return self.get_bool('SELENIUM', 'SoftNavigation')
+
+    @property
+    def soft_navigation_timeout(self) -> float:
+        return self.get_float('SELENIUM', 'SoftNavigationTimeout', 3.0)
+
+    @property
+    def angular_wait_fallback(self) -> float:
+        return self.get_float('SELENIUM', 'AngularWaitFallback', 0.5)
+
+    @property
+    def element_index(self) -> bool:
+        return self.get_bool('SELENIUM', 'ElementIndex')
+
+    @property
+    def locator_cache(self) -> bool:
+        return self.get_bool('SELENIUM', 'LocatorCache')
+
+    @property
+    def text_entry(self) -> str:
+        return self.get('SELENIUM', 'TextEntry', 'keys')
+
+    @property
+    def paste_threshold(self) -> int:
+        return self.get_int('SELENIUM', 'PasteThreshold', 50)
+
+    @property
+    def native_widgets(self) -> bool:
+        return self.get_bool('SELENIUM', 'NativeWidgets')
+
+
+_config = None
+_lock = threading.Lock()
+
+
+def get_config(file_name: str='') -> CyanConfig:
+    """
+    Get the process' settings, the settings file is read on the first call only.
+
+    :param file_name: The settings file path, defaults to the project's settings.ini
+    :return: The settings
+    """
+    global _config
+
+    with _lock:
+        if _config is None or (file_name and os.path.abspath(file_name) != os.path.abspath(_config.file_name)):
+            _config = CyanConfig(file_name)
+
+        return _config
+
+
+def get_project_path() -> str:
+    """
+    Get the project's folder, the one that contains the cyan checkout (or CYAN_PROJECT_PATH if set).
+    """
+    path = os.environ.get('CYAN_PROJECT_PATH')
+
+    if path:
+        return path
+
+    package_path = os.path.dirname(os.path.abspath(__file__))
+
+    return os.path.dirname(os.path.dirname(package_path))
+
+
+def make_private_dir(path: str):
+    """
+    Create a folder for files that must stay on this machine: only the current user can access it, and it
+    holds a '.gitignore' that keeps its files out of version control.
+
+    :param path: The folder path
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    ignore_file = os.path.join(path, '.gitignore')
+
+    if not os.path.exists(ignore_file):
+        with open(ignore_file, 'w') as ignore:
+            ignore.write('*\n')
+
+
+def open_private(path: str):
+    """
+    Open a file for writing, it's created readable and writable by the current user only (0600).
+
+    :param path: The file path
+    """
+    return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w')
+
+
+def get_config_path() -> str:
+    return os.path.join(get_project_path(), 'settings.ini')
+
+
+def get_driver_path(driver_name: str) -> str:
+    """
+    Get the absolute path of a driver from its path relative to the project's folder.
+
+    :param driver_name: The relative path, with either '\\' or '/' separators
+    """
+    parts = [part for part in re.split(r'[\\/]', driver_name) if part]
+
+    return os.path.join(get_project_path(), *parts)
@@ -1,14 +1,40 @@
+from collections import OrderedDict
+import argparse
+import io
+import multiprocessing
+import multiprocessing.util
+import sys
+import time
+import unittest
+
+from teamcity.messages import TeamcityServiceMessages
 from teamcity.unittestpy import TeamcityTestResult
 from teamcity.unittestpy import TeamcityTestRunner
-from . import dom
+from . import common, config, dom, durations, nav
 
 
 class CyanTestResult(TeamcityTestResult):
 
     def __init__(self, stream, descriptions=None, verbosity=None):
         super(CyanTestResult, self).__init__(stream, descriptions, verbosity)
+        self.durations = {}
+        self._start_times = {}
+
+    def startTest(self, test):
+        self._start_times[test] = time.time()
+        super(CyanTestResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(CyanTestResult, self).stopTest(test)
+        start_time = self._start_times.pop(test, None)
+
+        if start_time is not None:
+            # keyed by test.id(), as the sharding looks the tests up (get_test_id adds the docstring)
+            self.durations[test.id()] = time.time() - start_time
 
     def report_fail(self, test, fail_type, err):
+        # the failure may come from the driver, don't trust the cached session state any more
+        common.get_session().invalidate()
 
         if not isinstance(test, str):
             file_name = test._testMethodName
@@ -20,13 +46,173 @@ class CyanTestResult(TeamcityTestResult):
     def get_directory_structure(self, test) -> str:
         values = super(CyanTestResult, self).get_test_id(test).split(".")
 
-        return "./Screenshots/{0}/{1}".format(values[0], values[1])
+        return "{0}/{1}/{2}".format(common.screenshot_dir, values[0], values[1])
 
 
 class CyanTestRunner(TeamcityTestRunner):
     resultclass = CyanTestResult
 
-if __name__ == '__main__':
-    from unittest import main
+    def __init__(self, *args, workers: int=1, shard_count: int=1, shard_index: int=0,
+                 durations_file: str='./durations.json', **kwargs):
+        """
+        :param workers: Number of worker processes, test classes are spread across them when more than 1
+        :param shard_count: Number of shards the suite is split into, by the tests duration history
+        :param shard_index: The shard to run, zero based
+        :param durations_file: The tests duration history file
+        """
+        super(CyanTestRunner, self).__init__(*args, **kwargs)
+        self.workers = workers
+        self.shard_count = shard_count
+        self.shard_index = shard_index
+        self.history = durations.DurationHistory(durations_file)
+
+    def run(self, test):
+        if self.shard_count > 1:
+            test = self.get_shard(test)
+
+        if self.workers < 2:
+            result = super(CyanTestRunner, self).run(test)
+        else:
+            result = self.run_parallel(test)
+
+        self.history.record_all(result.durations)
+        self.history.save()
+
+        return result
+
+    def get_shard(self, test) -> unittest.TestSuite:
+        """
+        Get the tests of this runner's shard, slowest test class first.
+
+        :param test: The whole test suite
+        :return: The shard's test suite
+        """
+        tests = dict((item.id(), item) for item in _iter_tests(test))
+        shards = durations.split_into_shards(get_test_classes(test), self.shard_count, self.history)
+
+        return unittest.TestSuite(tests[test_id] for group in shards[self.shard_index] for test_id in group)
+
+    def run_parallel(self, test):
+        """
+        Run the test classes of a suite on a pool of worker processes, slowest class first. Each worker has
+        its own browser and screenshot folder, and the service messages of each test class are written to
+        stdout in one piece once the class finished, so the build server reads them as a coherent stream.
+
+        :param test: The test suite to run
+        :return: The merged test result
+        """
+        result = unittest.TestResult()
+        result.durations = {}
+        groups = durations.sort_by_duration(get_test_classes(test), self.history)
+        start_time = time.time()
+
+        TeamcityServiceMessages(sys.stdout).testCount(test.countTestCases())
+
+        workers = max(1, min(self.workers, len(groups)))
+        counter = multiprocessing.Value('i', 0)
+        pool = multiprocessing.Pool(workers, _init_worker, (counter, common.screenshot_dir))
+
+        try:
+            for outcome in pool.imap_unordered(_run_test_names, groups):
+                sys.stdout.write(outcome['output'])
+                sys.stdout.flush()
+
+                result.testsRun += outcome['run']
+                result.failures.extend(outcome['failures'])
+                result.errors.extend(outcome['errors'])
+                result.skipped.extend(outcome['skipped'])
+                result.durations.update(outcome['durations'])
+        finally:
+            pool.close()
+            pool.join()
+
+        time_taken = time.time() - start_time
+        self.stream.writeln("Ran %d test%s in %.3fs on %d workers" % (
+            result.testsRun, result.testsRun != 1 and "s" or "", time_taken, workers))
+        self.stream.writeln(result.wasSuccessful() and "OK" or "FAILED (failures=%d, errors=%d)" % (
+            len(result.failures), len(result.errors)))
+
+        return result
+
+
+def get_test_classes(suite) -> list:
+    """
+    Group the test ids of a suite by their test class.
 
-    main(module=None, testRunner=CyanTestRunner())
+    :param suite: The test suite
+    :return: A list of test id lists, one per test class
+    """
+    groups = OrderedDict()
+
+    for test in _iter_tests(suite):
+        key = "%s.%s" % (test.__class__.__module__, test.__class__.__name__)
+        groups.setdefault(key, []).append(test.id())
+
+    return list(groups.values())
+
+
+def _iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
+def _init_worker(counter, screenshot_dir: str):
+    with counter.get_lock():
+        counter.value += 1
+        index = counter.value
+
+    common.screenshot_dir = "%s/worker-%d" % (screenshot_dir, index)
+
+    # settings of a '[<SECTION>:worker-N]' section apply to this worker only
+    config.get_config().use_overlay("worker-%d" % index)
+
+    # pool workers leave through os._exit, so atexit would never close the browser
+    multiprocessing.util.Finalize(None, nav.quit_browser, exitpriority=10)
+
+
+def _run_test_names(names: list) -> dict:
+    suite = unittest.defaultTestLoader.loadTestsFromNames(names)
+    output = io.StringIO()
+
+    result = CyanTestResult(output)
+    # no encoding, the messages are written to the text buffer as str
+    result.messages = TeamcityServiceMessages(output, encoding=None)
+
+    result.startTestRun()
+    try:
+        suite(result)
+    finally:
+        result.stopTestRun()
+
+    return {
+        'output': output.getvalue(),
+        'run': result.testsRun,
+        'failures': [(test.id(), err) for test, err in result.failures],
+        'errors': [(test.id(), err) for test, err in result.errors],
+        'skipped': [(test.id(), reason) for test, reason in result.skipped],
+        'durations': result.durations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--shard-count', type=int, default=1)
+    parser.add_argument('--shard-index', type=int, default=0)
+    parser.add_argument('--durations', default='./durations.json')
+    parser.add_argument('--overlay', action='append', default=[])
+    args, argv = parser.parse_known_args()
+
+    for overlay in args.overlay:
+        config.get_config().use_overlay(overlay)
+
+    runner = CyanTestRunner(workers=args.workers, shard_count=args.shard_count, shard_index=args.shard_index,
+                            durations_file=args.durations)
+    unittest.main(module=None, argv=sys.argv[:1] + argv, testRunner=runner)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module contains a small local daemon that keeps a warm pool of WebDriver sessions, so test
+    processes attach to a running browser instead of launching their own.
+
+    Start it with::
+
+        python -m cyan.daemon --size 2 --port 4455
+
+    and set 'UseDaemon = True' (and 'DaemonUrl' if not http://localhost:4455) in the SELENIUM
+    section of settings.ini. A browser borrowed from the daemon is handed back, instead of quit,
+    by nav.quit_browser; the daemon relaunches it after 'recycle_after' uses or when it's broken.
+
+    ---------------------------------------------------------------------
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from . import common, pool, security
+
+
+class BrowserDaemon(object):
+    def __init__(self, size: int=2, recycle_after: int=20, lease_timeout: float=1800.0, factory=None):
+        """
+        :param size: Number of browsers to keep warm
+        :param recycle_after: Uses of a browser before it's relaunched
+        :param lease_timeout: Seconds after which a browser that wasn't handed back is taken back
+        :param factory: Callable that launches a new web driver, defaults to security.create_local_browser
+        """
+        self.recycle_after = recycle_after
+        self.lease_timeout = lease_timeout
+        # the daemon's settings may say UseDaemon too, its browsers must not be borrowed from itself
+        self.pool = pool.BrowserPool(size, factory or security.create_local_browser)
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.pool.start()
+
+        return self
+
+    def acquire(self, timeout: float=None) -> dict:
+        """
+        Lend a browser.
+
+        :param timeout: Seconds to wait for a free browser
+        :return: The command executor url, the session id to attach to, and the session's capabilities and
+                 protocol (w3c)
+        """
+        session = self.pool.acquire(timeout)
+        session.classes_run += 1
+
+        with self._lock:
+            self._leases[session.browser.session_id] = (session, time.time())
+
+        return {'executor': session.browser.command_executor._url, 'session_id': session.browser.session_id,
+                'capabilities': session.browser.capabilities, 'w3c': session.browser.w3c}
+
+    def release(self, session_id: str, healthy: bool=True) -> bool:
+        """
+        Take a browser back. It's cleaned for the next test process, or relaunched if it's broken or has
+        been used 'recycle_after' times.
+
+        :param session_id: The browser's session id
+        :param healthy: False if the test process found the browser broken
+        :return: False if the browser wasn't lent by this daemon
+        """
+        with self._lock:
+            session, _ = self._leases.pop(session_id, (None, None))
+
+        if session is None:
+            return False
+
+        if healthy and session.classes_run < self.recycle_after:
+            healthy = self._clean(session.browser)
+
+        if not healthy or session.classes_run >= self.recycle_after:
+            self._quit(session)
+
+        self.pool.release(session)
+
+        return True
+
+    def reap(self):
+        """
+        Take back the browsers lent for longer than lease_timeout, their test process probably died.
+        """
+        now = time.time()
+
+        with self._lock:
+            expired = [session_id for session_id, (_, lease_time) in self._leases.items()
+                       if now - lease_time > self.lease_timeout]
+
+        for session_id in expired:
+            self.release(session_id, False)
+
+    def close(self):
+        self.pool.close()
+
+    def status(self) -> dict:
+        with self._lock:
+            leased = len(self._leases)
+
+        return {'size': self.pool.size, 'leased': leased}
+
+    @staticmethod
+    def _clean(browser) -> bool:
+        try:
+            handles = browser.window_handles
+
+            for handle in handles[1:]:
+                browser.switch_to.window(handle)
+                browser.close()
+
+            browser.switch_to.window(handles[0])
+            browser.get('about:blank')
+        except (WebDriverException, IndexError, ConnectionError):
+            return False
+
+        return True
+
+    @staticmethod
+    def _quit(session: common.Session):
+        try:
+            session.browser.quit()
+        except (WebDriverException, ConnectionError):
+            pass
+
+        session.browser = None
+        session.classes_run = 0
+
+
+class AttachedDriver(webdriver.Remote):
+    """
+    A remote web driver attached to a session lent by the daemon, quitting it hands the session back.
+    """
+
+    def __init__(self, daemon_url: str, executor: str, session_id: str, capabilities: dict=None,
+                 w3c: bool=True):
+        """
+        :param daemon_url: The daemon's url
+        :param executor: The lent session's command executor url
+        :param session_id: The lent session's id
+        :param capabilities: The lent session's capabilities
+        :param w3c: Whether the lent session speaks the W3C protocol, rather than the JSON wire protocol
+        """
+        self.daemon_url = daemon_url
+        self._lease = (session_id, capabilities or {}, w3c)
+        super(AttachedDriver, self).__init__(command_executor=executor, desired_capabilities=capabilities or {})
+
+    def start_session(self, capabilities, browser_profile=None):
+        # attach to the lent session instead of creating a new one
+        self.session_id, self.capabilities, self.w3c = self._lease
+        self.command_executor.w3c = self.w3c
+
+    def quit(self, healthy: bool=True):
+        _post(self.daemon_url, '/release', {'session_id': self.session_id, 'healthy': healthy})
+
+
+def attach(daemon_url: str, timeout: float=300.0) -> AttachedDriver:
+    """
+    Borrow a browser from the daemon.
+
+    :param daemon_url: The daemon's url
+    :param timeout: Seconds to wait for a free browser
+    :return: A web driver attached to the borrowed browser
+    """
+    lease = _post(daemon_url, '/acquire', {'timeout': timeout}, timeout + 10)
+
+    return AttachedDriver(daemon_url, lease['executor'], lease['session_id'], lease.get('capabilities'),
+                          lease.get('w3c', True))
+
+
+def _post(daemon_url: str, path: str, values: dict, timeout: float=60.0) -> dict:
+    request = urllib.request.Request(daemon_url.rstrip('/') + path, json.dumps(values).encode('utf-8'),
+                                     {'Content-Type': 'application/json'})
+
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    browser_daemon = None
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._reply(200, self.browser_daemon.status())
+        else:
+            self._reply(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        values = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+
+        try:
+            if self.path == '/acquire':
+                self._reply(200, self.browser_daemon.acquire(values.get('timeout')))
+            elif self.path == '/release':
+                released = self.browser_daemon.release(values['session_id'], values.get('healthy', True))
+                self._reply(200 if released else 404, {'released': released})
+            else:
+                self._reply(404, {'error': 'unknown path %s' % self.path})
+        except queue.Empty:
+            self._reply(503, {'error': 'no browser available'})
+
+    def _reply(self, status: int, values: dict):
+        body = json.dumps(values).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(browser_daemon: BrowserDaemon, port: int=4455, host: str='localhost'):
+    """
+    Serve a daemon's browsers over HTTP until interrupted.
+
+    :param browser_daemon: The started daemon
+    :param port: The port to listen on
+    :param host: The interface to listen on
+    """
+    handler = type('RequestHandler', (_RequestHandler,), {'browser_daemon': browser_daemon})
+    server = _ThreadingHTTPServer((host, port), handler)
+
+    def reap():
+        while True:
+            time.sleep(30)
+            browser_daemon.reap()
+
+    threading.Thread(target=reap, daemon=True).start()
+    print('serving %d browsers at http://%s:%d' % (browser_daemon.pool.size, host, port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        browser_daemon.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep a warm pool of browsers for cyan test processes.')
+    parser.add_argument('--size', type=int, default=2)
+    parser.add_argument('--port', type=int, default=4455)
+    parser.add_argument('--recycle-after', type=int, default=20)
+    args = parser.parse_args()
+
+    serve(BrowserDaemon(args.size, args.recycle_after).start(), args.port)
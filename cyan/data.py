@@ -12,12 +12,38 @@
 
 import string
 
-from faker import Faker
-import pypyodbc
-
 from . import common, security
 
-fake = Faker()
+_fake = None
+
+
+def get_faker():
+    """
+    Get the shared Faker instance, it's created on first use as loading its providers is slow.
+
+    :return: The Faker instance
+    """
+    global _fake
+
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+
+    return _fake
+
+
+def __getattr__(name):
+    # keeps 'data.fake' working without building the Faker instance at import time
+    if name == 'fake':
+        return get_faker()
+
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def _connect():
+    import pypyodbc
+
+    return pypyodbc.connect(common.connection_string)
 
 
 def sql_execute(sql: string):
@@ -27,7 +53,7 @@ def sql_execute(sql: string):
     :param sql: The SQL statement to be executed.
     """
     security.check_self()
-    conn = pypyodbc.connect(common.connection_string)
+    conn = _connect()
     cur = conn.cursor()
     cur.execute(sql)
     cur.commit()
@@ -44,7 +70,7 @@ def sql_select(sql: string) -> string:
     """
     security.check_self()
 
-    conn = pypyodbc.connect(common.connection_string)
+    conn = _connect()
     cur = conn.cursor()
     cur.execute(sql)
     row = cur.fetchall()
@@ -71,7 +97,7 @@ def sql_execute_file(path: string):
 
 
 def sql_execute_files(files, fetch_type: common.CursorFetchType = common.CursorFetchType.All):
-    conn = pypyodbc.connect(common.connection_string)
+    conn = _connect()
     cur = conn.cursor()
 
     for file in files:
@@ -124,4 +150,4 @@ def get_random_text(prefix: string) -> string:
     :param prefix: The prefix for the random text
     :return: A random word post-fixed with a random number within the range of (0-9999)
     """
-    return '%s%d' % (prefix, fake.random_int(min=0, max=9999))  # (prefix, random.random() * 100)
+    return '%s%d' % (prefix, get_faker().random_int(min=0, max=9999))  # (prefix, random.random() * 100)
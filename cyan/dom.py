@@ -9,23 +9,19 @@
 
 """
 
-from http.client import CannotSendRequest
+from collections import namedtuple
 import datetime
 import time
 import string
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as ec
 from selenium import webdriver
 from selenium.common.exceptions import *
 from selenium.webdriver.remote.webelement import *
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-import sys
-
-sys.path.append("../..")
-from . import security, common
+from . import security, common, config, runtime
 
 
 def get_browser() -> webdriver.chrome.webdriver.WebDriver:
@@ -35,7 +31,7 @@ def get_browser() -> webdriver.chrome.webdriver.WebDriver:
     :return: The web driver
     :rtype: WebDriver
     """
-    return common.browser
+    return common.get_browser()
 
 
 def wait_for_text_present(text_to_present: str, text_element: str, by: By = By.CSS_SELECTOR, timer: int = 10):
@@ -49,10 +45,7 @@ def wait_for_text_present(text_to_present: str, text_element: str, by: By = By.C
     """
     security.check_self()
 
-    wait_visibility_of_element(text_element, by, timer)
-
-    WebDriverWait(common.browser, timeout=10).until(
-        element_text_available_callback(text_to_present, text_element, by))
+    wait_until(text_element, by, 'text', text_to_present, timer)
 
 
 def wait_presence_of_element(search_filter, by: By = By.CSS_SELECTOR, timer: int = 10):
@@ -65,9 +58,7 @@ def wait_presence_of_element(search_filter, by: By = By.CSS_SELECTOR, timer: int
     """
     security.check_self()
 
-    WebDriverWait(common.browser, timeout=timer).until(
-        ec.presence_of_element_located((by, search_filter))
-    )
+    wait_until(search_filter, by, 'present', timer=timer, msg='')
 
 
 def wait_presence_of_element_by_text(element_text: str, timer: int = 10,
@@ -83,9 +74,7 @@ def wait_presence_of_element_by_text(element_text: str, timer: int = 10,
 
     xpath = common.get_attr_xpath("//.", "text()", element_text, search_type)
 
-    WebDriverWait(common.browser, timeout=timer).until(
-        ec.presence_of_element_located((By.XPATH, xpath))
-    )
+    wait_until(xpath, By.XPATH, 'present', timer=timer, msg='')
 
 
 def element_text_available_callback(element_text: str, element: str, by: By = By.CSS_SELECTOR):
@@ -122,8 +111,7 @@ def wait_visibility_of_element(search_filter, element_by: By = By.CSS_SELECTOR,
     :param element_by: element filter type
     """
     security.check_self()
-    WebDriverWait(common.browser, timer) \
-        .until(lambda s: s.find_element(element_by, search_filter).is_displayed(), msg)
+    wait_until(search_filter, element_by, 'visible', timer=timer, msg=msg)
 
 
 def wait_for_element_enabled(search_filter, element_by: By=By.CSS_SELECTOR, timer: int=10,
@@ -136,8 +124,7 @@ def wait_for_element_enabled(search_filter, element_by: By=By.CSS_SELECTOR, time
     :param element_by: element filter type
     """
     security.check_self()
-    WebDriverWait(common.browser, timer) \
-        .until(lambda s: s.find_element(element_by, search_filter).is_enabled(), msg)
+    wait_until(search_filter, element_by, 'enabled', timer=timer, msg=msg)
 
 
 def wait_non_visibility_of_element(search_filter, element_by: By=By.CSS_SELECTOR, timer: int=10,
@@ -150,8 +137,7 @@ def wait_non_visibility_of_element(search_filter, element_by: By=By.CSS_SELECTOR
     :param element_by: element filter type
     """
     security.check_self()
-    WebDriverWait(common.browser, timer) \
-        .until_not(lambda s: s.find_element(element_by, search_filter).is_displayed(), msg)
+    wait_until(search_filter, element_by, 'invisible', timer=timer, msg=msg)
 
 
 def wait_visibility_of_element_by_text(element_text: str, timer: int = 10,
@@ -168,8 +154,7 @@ def wait_visibility_of_element_by_text(element_text: str, timer: int = 10,
     security.check_self()
     xpath = common.get_attr_xpath("//.", "text()", element_text, search_type)
 
-    WebDriverWait(common.browser, timer) \
-        .until(lambda s: s.find_element(By.XPATH, xpath).is_displayed(), msg)
+    wait_until(xpath, By.XPATH, 'visible', timer=timer, msg=msg)
 
 
 def wait_visibility_of_ng_element(model_name: str, timer: int = 10, element_tag: str = '*', angular_prefix: str = 'ng',
@@ -189,8 +174,111 @@ def wait_visibility_of_ng_element(model_name: str, timer: int = 10, element_tag:
     attr_name = "%s-model" % angular_prefix
     xpath = "//%s[@%s='%s']" % (element_tag, attr_name, model_name)
 
-    WebDriverWait(common.browser, timer) \
-        .until(lambda s: s.find_element(By.XPATH, xpath).is_displayed(), msg)
+    wait_until(xpath, By.XPATH, 'visible', timer=timer, msg=msg)
+
+
+ElementState = namedtuple('ElementState', 'present visible enabled selected text value')
+ElementState.__doc__ = "The state of an element as returned by query_states, a missing element isn't present."
+
+_MISSING_STATE = ElementState(False, False, False, False, None, None)
+
+
+def query_states(locators: list) -> list:
+    """
+    Get the state of many elements in a single browser call.
+
+    :param locators: The elements identifiers, either a css selector or a (search_filter, by) tuple each
+    :return: An ElementState (present, visible, enabled, selected, text, value) per locator, in the same order
+    :rtype: list
+    """
+    security.check_self()
+
+    locators = [(locator, By.CSS_SELECTOR) if isinstance(locator, str) else tuple(locator) for locator in locators]
+    states = runtime.call('queryStates', locators)
+
+    return [ElementState(True, *state) if state else _MISSING_STATE for state in states]
+
+
+def query_state(search_filter: str, by: By = By.CSS_SELECTOR) -> ElementState:
+    """
+    Get the state of an element in a single browser call.
+
+    :param search_filter: The element identifier to search by
+    :param by: Element's filter type
+    :return: The element's state
+    """
+    return query_states([(search_filter, by)])[0]
+
+
+def extract(search_filter: str, fields=('text',), by: By = By.CSS_SELECTOR) -> list:
+    """
+    Read fields of all the matching elements in a single browser call.
+
+    :param search_filter: The elements identifier to search by
+    :param fields: A field name, or a tuple of them. 'text' is the visible text (as WebElement.text),
+                   'element' the WebElement itself, 'visible' whether it's displayed, 'textContent',
+                   'innerHTML', 'outerHTML', 'value' and 'href' the element's properties, and any other
+                   name an attribute
+    :param by: element filter type
+    :return: The field's value per element when fields is a name, a dict of the fields per element otherwise
+    """
+    security.check_self()
+
+    single = isinstance(fields, str)
+    names = [fields] if single else list(fields)
+    rows = runtime.call('extract', search_filter, by, names)
+
+    if single:
+        return [row[0] for row in rows]
+
+    return [dict(zip(names, row)) for row in rows]
+
+
+_WAIT_CONDITIONS = {
+    'present': lambda state, expected: state.present,
+    'visible': lambda state, expected: state.visible,
+    'invisible': lambda state, expected: not state.visible,
+    'enabled': lambda state, expected: state.present and state.enabled,
+    'text': lambda state, expected: state.present and state.text == expected,
+}
+
+
+def wait_until(search_filter: str, by: By = By.CSS_SELECTOR, condition: str = 'present', expected: str = None,
+               timer: int = 10, msg: str = 'Waiting for element timed out'):
+    """
+    Wait for a condition on an element. The condition is watched inside the page, by a MutationObserver,
+    so the wait is a single browser call that returns as soon as the condition holds. If the page
+    navigates away while waiting, the rest of the wait is done by polling.
+
+    :param search_filter: The element identifier to search by
+    :param by: element filter type
+    :param condition: 'present', 'visible', 'invisible', 'enabled' or 'text' (the element's text equals expected)
+    :param expected: The expected text for the 'text' condition
+    :param timer: time to wait before it through a timeout error
+    :param msg: Message of the timeout error
+    """
+    security.check_self()
+
+    start_time = time.time()
+
+    try:
+        result = runtime.call_async('waitFor', [search_filter, by], condition, expected, timer, timeout=timer + 5)
+    except WebDriverException:
+        # the script is lost when its document unloads
+        result = None
+
+    if result is True:
+        return
+    elif result is False:
+        raise TimeoutException(msg)
+    elif result is not None:
+        raise WebDriverException(result)
+
+    remaining = max(timer - (time.time() - start_time), 0.5)
+    check = _WAIT_CONDITIONS[condition]
+
+    WebDriverWait(common.get_browser(), remaining) \
+        .until(lambda s: check(query_state(search_filter, by), expected), msg)
 
 
 def is_element_present(search_filter: str, element_by: By = By.CSS_SELECTOR) -> bool:
@@ -203,22 +291,16 @@ def is_element_present(search_filter: str, element_by: By = By.CSS_SELECTOR) ->
     security.check_self()
 
     try:
-        return get_element(search_filter, element_by) is not None
-    except NoSuchElementException:
-        return False
+        return query_state(search_filter, element_by).present
     except ConnectionRefusedError:
         return False
-        # assert 0, "can't find element: '%s' using its '%s'" % (search_filter, element_by)
 
 
 def is_element_visible(search_filter: str, element_by: By = By.CSS_SELECTOR) -> bool:
     security.check_self()
 
     try:
-        element = get_element(search_filter, element_by)
-        return element.is_displayed()
-    except NoSuchElementException:
-        return False
+        return query_state(search_filter, element_by).visible
     except ConnectionRefusedError:
         return False
 
@@ -239,9 +321,7 @@ def is_element_visible_text(element_text: str) -> bool:
 
     try:
         ele = get_element_by_text(element_text)
-    except NoSuchElementException:
-        return False
-    except ConnectionRefusedError:
+    except (NoSuchElementException, ConnectionRefusedError):
         return False
 
     if ele:
@@ -253,7 +333,7 @@ def is_element_visible_text(element_text: str) -> bool:
 def is_element_visible_attr(attr_name: str, attr_value: str, tag: str = 'input') -> bool:
     state = False
     xpath = "//{0}[@{1}='{2}']".format(tag, attr_name, attr_value)
-    ele = common.browser.find_elements_by_xpath(xpath)
+    ele = common.get_browser().find_elements_by_xpath(xpath)
 
     if ele:
         state = ele.is_displayed()
@@ -290,10 +370,7 @@ def is_element_selected(search_filter: str, element_by: By = By.CSS_SELECTOR) ->
     security.check_self()
 
     try:
-        element = get_element(search_filter, element_by)
-        return element.is_selected()
-    except NoSuchElementException:
-        return False
+        return query_state(search_filter, element_by).selected
     except ConnectionRefusedError:
         return False
 
@@ -319,10 +396,7 @@ def is_element_enabled(search_filter: str, element_by: By = By.CSS_SELECTOR) ->
     security.check_self()
 
     try:
-        element = get_element(search_filter, element_by)
-        return element.is_enabled()
-    except NoSuchElementException:
-        return False
+        return query_state(search_filter, element_by).enabled
     except ConnectionRefusedError:
         return False
 
@@ -330,21 +404,24 @@ def is_element_enabled(search_filter: str, element_by: By = By.CSS_SELECTOR) ->
 def select_from_dropdown(xpath: str, selection: str):
     dropdown = get_element(xpath, By.XPATH)
     dropdown.click()
-    wait(0.5)
+    wait_for_angular()
 
     css = "div.list-item:nth-child(" + selection + ")"  # Select the nth option from the drop down list
     option = get_element(css)
     option.click()
-    wait(0.5)
+    wait_for_angular()
 
 
 def select_from_dropdown_search(css: str, selection: str):
+    if select_widget_item(selection, css):
+        return
+
     css1 = css + ' .play'
     we = get_elements(css1)
     we[0].click()  # Open up the entry box
 
     css2 = css + ' input'
-    wait(1)
+    wait_for_angular()
     we = get_element(css2)
     we.send_keys(Keys.CONTROL + "a")
     we.send_keys(selection)
@@ -356,21 +433,55 @@ def select_from_dropdown_search(css: str, selection: str):
     we[0].click()
 
 
-def get_Options_from_dropdown_search(css: str):
-    options = []
+def select_widget_item(value: str, search_filter: str, by: By = By.CSS_SELECTOR, widget: str = 'list',
+                       search_type: common.TextSearchType = common.TextSearchType.Contain) -> bool:
+    """
+    Select an item of a BlueBridge 'list' or a select2 drop-down without opening it: the item is set through
+    the list's ng-model, or the select2's jQuery API, in a single browser call that returns once the app
+    settled. It's only done when the NativeWidgets setting is on, so verification runs keep clicking
+    through the widgets.
+
+    :param value: The text of the item to select
+    :param search_filter: The identifier of the widget, or of an element inside it (the first visible one is used)
+    :param by: element filter type
+    :param widget: 'list' or 'select2'
+    :param search_type: How the item's text is matched
+    :return: False if the item wasn't selected this way, the caller has to click through the widget then
+    """
+    security.check_self()
+
+    if not config.get_config().native_widgets:
+        return False
+
+    function = 'selectListItem' if widget == 'list' else 'selectSelect2Item'
+
+    try:
+        error = runtime.call_async(function, [search_filter, by], value, search_type.value)
+    except WebDriverException:
+        return False
 
+    return error is None
+
+
+def get_visible_elements(search_filter: str, by: By = By.CSS_SELECTOR) -> list:
+    """
+    Get the displayed elements matching an identifier, in a single browser call.
+
+    :param search_filter: The elements identifier to search by
+    :param by: element filter type
+    :return: The displayed elements
+    """
+    return [row['element'] for row in extract(search_filter, ('element', 'visible'), by) if row['visible']]
+
+
+def get_Options_from_dropdown_search(css: str):
     css1 = css + ' .play'
     wait_presence_of_element(css)
     we = get_element(css1)
     we.click()  # Open up the entry box
 
     new_css = '.list-options .list-item'
-    we = get_elements(new_css)
-    count = len(we)
-
-    for x in range(0, (count - 1)):
-        name = we[x].text
-        options.append(name)
+    options = extract(new_css, 'text')[:-1]
 
     css2 = css + ' input'
     we = get_element(css2)
@@ -382,12 +493,12 @@ def get_Options_from_dropdown_search(css: str):
 def select_from_dropdown_CSS(css: str, selection: str):
     dropdown = get_element(css)
     dropdown.click()
-    wait(0.5)
+    wait_for_angular()
 
     css = "div.list-item:nth-child(" + selection + ")"  # Select the nth option from the drop down list
     option = get_element(css)
     option.click()
-    wait(0.5)
+    wait_for_angular()
 
 
 def select_from_add(css: str, name: str):
@@ -416,7 +527,7 @@ def select_from_dropdown_no_search(css: str, selection: str):
             option.click()
             break
 
-    wait(0.5)
+    wait_for_angular()
 
 
 def validate_element(element: WebElement):
@@ -437,7 +548,49 @@ def get_element(search_filter: str, by: By = By.CSS_SELECTOR) -> WebElement:
     :rtype: WebElement
     """
     security.check_self()
-    return common.browser.find_element(by, search_filter)
+
+    if not config.get_config().locator_cache:
+        return common.get_browser().find_element(by, search_filter)
+
+    locators = common.get_session().locators
+    element = locators.get((by, search_filter))
+
+    if element is None:
+        element = CachedElement(common.get_browser().find_element(by, search_filter), search_filter, by)
+        locators[(by, search_filter)] = element
+
+    return element
+
+
+class CachedElement(WebElement):
+    """
+    An element found by get_element and kept in the session's locator cache, when the LocatorCache
+    setting is on. The cache is cleared on navigation, refresh and clicks (see common.Session.clear_locators),
+    so finding the same locator again costs no browser call. If the page replaced the element anyway, the
+    command or script (see runtime.execute) that finds it stale finds the locator again and is retried.
+    """
+
+    def __init__(self, element: WebElement, search_filter: str, by: By = By.CSS_SELECTOR):
+        # take over the found element's driver and id, whatever the selenium version stores
+        self.__dict__.update(element.__dict__)
+        self.locator = (by, search_filter)
+
+    def _execute(self, command, params=None):
+        try:
+            return super(CachedElement, self)._execute(command, params)
+        except StaleElementReferenceException:
+            self.refresh()
+            return super(CachedElement, self)._execute(command, params)
+
+    def refresh(self):
+        """
+        Find the element's locator again, after the page replaced the element.
+        """
+        try:
+            self._id = self._parent.find_element(*self.locator).id
+        except NoSuchElementException:
+            common.get_session().locators.pop(self.locator, None)
+            raise
 
 
 def get_element_by_value(value: str, search_type: common.TextSearchType = common.TextSearchType.Contain) -> WebElement:
@@ -452,7 +605,7 @@ def get_element_by_value(value: str, search_type: common.TextSearchType = common
 
     xpath = common.get_attr_xpath("//*", "value()", value, search_type)
 
-    return common.browser.find_elements_by_xpath(xpath)
+    return common.get_browser().find_elements_by_xpath(xpath)
 
 
 def get_element_by_text(value: str, tag: str = '*',
@@ -467,6 +620,9 @@ def get_element_by_text(value: str, tag: str = '*',
 
     security.check_self()
 
+    if config.get_config().element_index:
+        return find_indexed('text', value, search_type, tag)
+
     prefix = "//%s" % tag
 
     xpath = common.get_attr_xpath(prefix, 'normalize-space(text())', value, search_type)
@@ -491,11 +647,14 @@ def get_element_by_attribute(attribute_name: str, attribute_value: str, element_
 
     security.check_self()
 
+    if config.get_config().element_index and attribute_name.lstrip('@') in _INDEXED_ATTRIBUTES:
+        return find_indexed(attribute_name.lstrip('@'), attribute_value, search_type, element_tag)
+
     prefix = "//%s" % element_tag
 
     xpath = common.get_attr_xpath(prefix, attribute_name, attribute_value, search_type)
 
-    return common.browser.find_element_by_xpath(xpath)
+    return common.get_browser().find_element_by_xpath(xpath)
 
 
 def get_element_by_angular_model(model_name: str, element_tag: str = '*', angular_prefix: str = 'ng') -> WebElement:
@@ -523,7 +682,7 @@ def get_elements(search_filter: str, by: By = By.CSS_SELECTOR):
     """
     security.check_self()
 
-    return common.browser.find_elements(by, search_filter)
+    return common.get_browser().find_elements(by, search_filter)
 
 
 def get_label_by_partial_text(label_text: str) -> WebElement:
@@ -547,10 +706,41 @@ def get_label_by_text(label_text: str, search_type: common.TextSearchType = comm
 
     security.check_self()
 
+    if config.get_config().element_index:
+        return find_indexed('text', label_text, search_type, 'label')
+
     xpath = common.get_attr_xpath("//label", "text()", label_text, search_type)
     return get_element(xpath, By.XPATH)
 
 
+_INDEXED_ATTRIBUTES = ('ng-model', 'data-ng-model', 'placeholder', 'name')
+
+
+def find_indexed(kind: str, value: str, search_type: common.TextSearchType = common.TextSearchType.Exact,
+                 tag: str = '*') -> WebElement:
+    """
+    Find an element with the page's element index instead of an XPath search. The index maps the
+    elements' own text (the text of their direct text nodes, normalized) and their ng-model,
+    data-ng-model, placeholder and name attributes to the elements. It's built on the first lookup
+    in a document and kept up to date as the page changes, and unlike XPath 1.0 it supports
+    TextSearchType.End_with. It's used by the lookup helpers when the ElementIndex setting is on.
+
+    :param kind: 'text', 'labelFor' (a label's text, the element the label is for is returned) or
+                 one of the indexed attribute names
+    :param value: The text or attribute value to search for
+    :param search_type: How the value is matched
+    :param tag: The element's html tag, '*' for any
+    :return: The first matching element in document order
+    :raises NoSuchElementException: if no element matches
+    """
+    element = runtime.call('lookup', kind, value, search_type.value, tag)
+
+    if element is None:
+        raise NoSuchElementException("No element with %s '%s' in the element index" % (kind, value))
+
+    return element
+
+
 def get_link_by_text(link_text: str) -> WebElement:
     """
     Get a link by its text.
@@ -559,42 +749,55 @@ def get_link_by_text(link_text: str) -> WebElement:
     :return: The found label as WebElement
     """
     security.check_self()
-    link = common.browser.find_element_by_link_text(link_text)
+    link = common.get_browser().find_element_by_link_text(link_text)
 
     return link
 
 
 def all_windows_closed() -> bool:
     security.check_self()
-    # global browser
-
-    if common.browser is None:
-        return True
-    else:
-        try:
-            handles = common.browser.window_handles
 
-            return handles is None or len(handles) < 1
-        except CannotSendRequest:
-            common.browser = None
-            return True
+    return not security.is_alive()
 
 
 def wait(timer: int):
     time.sleep(timer)
 
 
+def wait_for_angular(timer: int = 10, fallback: float = None) -> bool:
+    """
+    Wait for the AngularJS app to be idle: no pending $http request nor $timeout. If the app's stability
+    can't be watched (no AngularJS on the page, or it didn't settle in time) it waits for a fixed time instead.
+
+    :param timer: time to wait for the app to be idle
+    :param fallback: seconds to wait when the app's stability can't be watched, defaults to the
+                     AngularWaitFallback setting
+    :return: True if the app reported itself idle
+    """
+    security.check_self()
+
+    try:
+        error = runtime.call_async('waitForAngular', timeout=timer)
+    except WebDriverException as e:
+        error = str(e)
+
+    if error is None:
+        return True
+
+    wait(config.get_config().angular_wait_fallback if fallback is None else fallback)
+
+    return False
+
+
 def scroll_to_bottom():
     """
-    takes a screenshot of the current web page and saves it in a folder called Screenshots.
+    Scrolls the page to the bottom, until no more content is loaded.
 
     """
     security.check_self()
     reached_bottom = False
     while not reached_bottom:
-        reached_bottom = common.browser.execute_script(
-            "return $(document).height() == Math.floor($(window).height() + $(window).scrollTop());")
-        common.browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        reached_bottom = runtime.call('scrollToBottom')
         wait(2)
 
 
@@ -606,9 +809,7 @@ def scroll_to_top():
     security.check_self()
     reached_top = False
     while not reached_top:
-        reached_top = common.browser.execute_script(
-            "return $(document).height() == Math.floor($(window).height() + $(window).scrollTop());")
-        common.browser.execute_script("window.scrollTo(0, 0);")
+        reached_top = runtime.call('scrollToTop')
         wait(2)
 
 
@@ -617,45 +818,57 @@ def scroll_down():
     scroll to the bottom of the page
     """
     security.check_self()
-    common.browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    runtime.call('scrollToBottom')
 
 
 def scroll_down_by(distance: int):
     security.check_self()
-    common.browser.execute_script("window.scrollBy(0, {value})".format(value=distance))
+    runtime.call('scrollBy', distance)
 
 
 def scroll_up(distance):
     security.check_self()
-    text = "window.scrollBy(0,-" + distance + ")"
-    common.browser.execute_script(text, "")
+    runtime.call('scrollBy', -float(distance))
 
 
 def scroll_element_into_view(elementWe):
-    y = elementWe.location['y'] - 50
-    common.browser.execute_script('window.scrollTo(0, {0})'.format(y))
+    runtime.call('scrollIntoView', elementWe, 50)
     wait(0.5)
 
 
 def execute_script(script, ele):
-    common.browser.execute_script(script, ele)
+    runtime.execute(script, ele)
 
 
-def screen_shot(file_name: str, file_directory: str = './Screenshots'):
+def execute_async_script(script: str, *args, timeout: float = 30):
+    """
+    Run an asynchronous script, it signals its completion by calling its last argument.
+
+    :param script: The script to run
+    :param args: The script's arguments
+    :param timeout: Seconds the driver waits for the script to complete
+    :return: The value the script completed with
+    """
+    runtime.set_script_timeout(common.get_browser(), timeout)
+
+    return runtime.execute(script, *args, asynchronous=True)
+
+
+def screen_shot(file_name: str, file_directory: str = ''):
     """
     takes a screen-shot of the current web page and saves. If the specified folder don't exists, it will be created
 
     :param file_name: name of the file to be saved. The current time in the format YYYYMMDD_HHMMSS will be added as suffix to the file name
-    :param file_directory: destination folder
+    :param file_directory: destination folder, defaults to common.screenshot_dir
     """
 
-    file_directory = file_directory or './Screenshots'
+    file_directory = file_directory or common.screenshot_dir
     if not os.path.exists(file_directory):
         os.makedirs(file_directory)
 
     file_name = '%s-%s.png' % (datetime.datetime.now().strftime('%Y%m%d_%H%M%S'), file_name)
 
-    common.browser.get_screenshot_as_file('%s/%s' % (file_directory, file_name))
+    common.get_browser().get_screenshot_as_file('%s/%s' % (file_directory, file_name))
 
 
 def click_Calendar(dateToChangeTo):
@@ -710,16 +923,61 @@ def click_Calendar(dateToChangeTo):
         get_element(calendarMonthOptions).click()
         get_element(monthToSelectLoc).click()
 
-    # select the day
-    cDates = get_elements(calendarAllDates)
-    dateWebAddress = cDates[selectingDay]
+    # select the day, by its month as the days of the previous and next months may be shown too
+    calendarDay = "//td[@data-handler='selectDay' and @data-month='%d' and @data-year='%s']/a[text()='%d']"
+
+    try:
+        dateWebAddress = get_element(calendarDay % (selectingMonth, dateYear, selectingDay + 1), By.XPATH)
+    except NoSuchElementException:
+        # jQuery UI before 1.9 doesn't tag the days with their month
+        cDates = get_elements(calendarAllDates)
+        dateWebAddress = cDates[selectingDay]
+
     dateWebAddress.click()
 
     return dateWebAddress
 
 
+def set_calendar_date(date, search_filter: str = None, by: By = By.CSS_SELECTOR, click: bool = False) -> str:
+    """
+    Set the date of a jQuery UI datepicker in a single browser call: the date is set with the datepicker's
+    setDate, and the bound model is notified as if the date was picked in the pop up.
+
+    :param date: The date, either a datetime.date or a string formatted as 'Mon 21 May, 2014'
+    :param search_filter: The datepicker's input (or inline element) identifier, defaults to the datepicker
+                          whose pop up is open
+    :param by: element filter type
+    :param click: Pick the date in the pop up instead, with click_Calendar. It's also done when the
+                  datepicker can't be set directly
+    :return: The date as rendered by the datepicker, for assertion
+    """
+    security.check_self()
+
+    if isinstance(date, str):
+        date = datetime.datetime.strptime(date, '%a %d %B, %Y')
+
+    locator = [search_filter, by] if search_filter else None
+
+    if not click:
+        try:
+            result = runtime.call_async('setDatepickerDate', locator, date.year, date.month, date.day)
+        except WebDriverException:
+            result = None
+
+        if result and not result['error']:
+            return result['value']
+
+    if search_filter:
+        get_element(search_filter, by).click()
+
+    click_Calendar(date.strftime('%a %d %B, %Y'))
+    wait_for_angular()
+
+    return runtime.call('getDatepickerText', locator)
+
+
 def send_browser_key(key: Keys):
-    ActionChains(common.browser).send_keys(key).perform()
+    ActionChains(common.get_browser()).send_keys(key).perform()
 
 
 def is_print_dialog_present(timeout: int = 5) -> bool:
@@ -746,6 +1004,16 @@ def get_growl_message():
 
 def get_facet_element(facet: string, value: string):
     """Select a value from a faceted search facet"""
+    security.check_self()
+
+    if config.get_config().element_index:
+        element = runtime.call('facet', facet, value)
+
+        if element is None:
+            raise NoSuchElementException("No facet '%s' with value '%s'" % (facet, value))
+
+        return element
+
     xpath = "//label[text()='" + facet + "']/following::ul[1]/li[contains(.,'" + value + "')]"
     return get_element(xpath, by=By.XPATH)
 
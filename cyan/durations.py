@@ -0,0 +1,112 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module keeps the history of the tests durations and uses it to split a suite into
+    shards that take about the same time to run.
+
+    ---------------------------------------------------------------------
+"""
+
+import heapq
+import json
+import os
+
+
+class DurationHistory(object):
+    file_name = ''
+
+    def __init__(self, file_name: str='./durations.json', default_duration: float=30.0, weight: float=0.5):
+        """
+        :param file_name: The history file
+        :param default_duration: Seconds assumed for a test when the history is empty
+        :param weight: Weight of the newest run in the moving average of a test's duration
+        """
+        self.file_name = file_name
+        self.default_duration = default_duration
+        self.weight = weight
+        self.durations = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.file_name, 'r') as history_file:
+                self.durations = json.load(history_file)
+        except (OSError, ValueError):
+            self.durations = {}
+
+    def save(self):
+        temp_name = '%s.%d.tmp' % (self.file_name, os.getpid())
+
+        with open(temp_name, 'w') as history_file:
+            json.dump(self.durations, history_file, indent=1, sort_keys=True)
+
+        os.replace(temp_name, self.file_name)
+
+    def record(self, test_id: str, seconds: float):
+        """
+        Record a run of a test, the stored duration is a moving average of the runs.
+
+        :param test_id: The test id, as returned by TestCase.id()
+        :param seconds: The test wall time
+        """
+        previous = self.durations.get(test_id)
+
+        if previous is not None:
+            seconds = previous + (seconds - previous) * self.weight
+
+        self.durations[test_id] = round(seconds, 3)
+
+    def record_all(self, durations: dict):
+        for test_id, seconds in durations.items():
+            self.record(test_id, seconds)
+
+    def estimate(self, test_id: str) -> float:
+        """
+        Get the expected duration of a test. A test with no history is expected to take the
+        median duration of the known tests.
+
+        :param test_id: The test id
+        :return: The duration in seconds
+        """
+        if test_id in self.durations:
+            return self.durations[test_id]
+
+        known = sorted(self.durations.values())
+
+        if not known:
+            return self.default_duration
+
+        return known[len(known) // 2]
+
+
+def split_into_shards(groups: list, shard_count: int, history: DurationHistory) -> list:
+    """
+    Split groups of tests into shards of about the same total duration. Each group (a test class)
+    is kept whole, the slowest groups are placed first and each one goes to the shortest shard so far.
+    Groups are ordered slowest-first inside each shard.
+
+    :param groups: A list of test id lists, as returned by cyanTestRunner.get_test_classes
+    :param shard_count: Number of shards
+    :param history: The durations history
+    :return: A list of shard_count lists of groups
+    """
+    shards = [[] for _ in range(shard_count)]
+    loads = [(0.0, index) for index in range(shard_count)]
+
+    for group in sort_by_duration(groups, history):
+        load, index = heapq.heappop(loads)
+        shards[index].append(group)
+        heapq.heappush(loads, (load + get_group_duration(group, history), index))
+
+    return shards
+
+
+def sort_by_duration(groups: list, history: DurationHistory) -> list:
+    """
+    Sort groups of tests slowest-first.
+    """
+    return sorted(groups, key=lambda group: get_group_duration(group, history), reverse=True)
+
+
+def get_group_duration(group: list, history: DurationHistory) -> float:
+    return sum(history.estimate(test_id) for test_id in group)
@@ -0,0 +1,119 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module reports the cold import cost of each cyan module. Every module is imported in a
+    fresh interpreter with '-X importtime', so nothing is shared between the measures.
+
+    Usage::
+
+        python -m cyan.import_benchmark [--repeat 3] [--top 5]
+
+    ---------------------------------------------------------------------
+"""
+
+import argparse
+import os
+import pkgutil
+import subprocess
+import sys
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_NAME = os.path.basename(PACKAGE_PATH)
+
+
+def get_module_names() -> list:
+    """
+    Get the full names of the package's modules.
+    """
+    this_module = os.path.splitext(os.path.basename(__file__))[0]
+
+    return ['%s.%s' % (PACKAGE_NAME, module.name) for module in pkgutil.iter_modules([PACKAGE_PATH])
+            if module.name != this_module]
+
+
+def measure_import(module_name: str) -> dict:
+    """
+    Import a module in a new interpreter.
+
+    :param module_name: The module's full name, or None to measure the interpreter startup only
+    :return: The module's cumulative import time and the self time of every imported module, in microseconds
+    """
+    statement = 'import %s' % module_name if module_name else 'pass'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                             cwd=os.path.dirname(PACKAGE_PATH), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    imports = {}
+    total = None
+
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+
+        self_time, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+
+        if not self_time.isdigit():
+            continue
+
+        imports[name] = int(self_time)
+
+        if name == module_name:
+            total = int(cumulative)
+
+    return {'error': process.returncode != 0 and process.stderr.strip().splitlines()[-1] or None,
+            'total': total,
+            'imports': imports}
+
+
+def get_top_level(module_name: str) -> str:
+    return module_name.split('.')[0]
+
+
+def run(repeat: int=3, top: int=5):
+    """
+    Print the cold import time of every module, slowest first, with the top-level packages that cost
+    the most to each one. Modules the interpreter imports at startup are left out.
+
+    :param repeat: Number of measures per module, the fastest one is kept
+    :param top: Number of costly packages to list per module
+    """
+    results = []
+    startup = measure_import(None)['imports']
+
+    for module_name in get_module_names():
+        measures = [measure_import(module_name) for _ in range(repeat)]
+        failed = [measure for measure in measures if measure['error']]
+
+        if failed:
+            results.append((None, module_name, failed[0]['error'], []))
+            continue
+
+        best = min(measures, key=lambda measure: measure['total'])
+        packages = {}
+
+        for name, self_time in best['imports'].items():
+            if name in startup:
+                continue
+
+            packages[get_top_level(name)] = packages.get(get_top_level(name), 0) + self_time
+
+        costly = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        results.append((best['total'], module_name, None, costly))
+
+    results.sort(key=lambda result: -1 if result[0] is None else result[0], reverse=True)
+
+    for total, module_name, error, costly in results:
+        if error:
+            print('%-30s %10s  %s' % (module_name, 'failed', error))
+            continue
+
+        details = ', '.join('%s %.1fms' % (name, self_time / 1000.0) for name, self_time in costly)
+        print('%-30s %8.1fms  %s' % (module_name, total / 1000.0, details))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the cold import cost of each cyan module.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.repeat, args.top)
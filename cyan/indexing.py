@@ -1,6 +1,9 @@
 import datetime
+import json
 import os
 
+from . import config
+
 
 class IndexingBase:
     file_name = ''
@@ -67,3 +70,67 @@ class IndexingBase:
 
     def run_index(self, index_name: str):
         print('indexing, dude')
+
+
+class MenuIndex(IndexingBase):
+    """
+    Maps menu paths, like 'Merchandising, Stock, Transfers', to the url their last item opens. The index
+    is kept in a JSON file that expires daily like the other indexes.
+    """
+
+    def __init__(self, file_name: str):
+        super(MenuIndex, self).__init__(file_name)
+        self.routes = None
+
+    @staticmethod
+    def get_key(path: list) -> str:
+        return ' > '.join(' '.join(item.split()).lower() for item in path)
+
+    def load(self) -> dict:
+        if self.routes is None:
+            self.routes = {}
+
+            if not self.is_file_expired():
+                try:
+                    with open(self.file_name, 'r') as index_file:
+                        self.routes = json.load(index_file)
+                except (OSError, ValueError):
+                    pass
+
+        return self.routes
+
+    def save(self):
+        directory = os.path.dirname(self.file_name)
+
+        if directory:
+            config.make_private_dir(directory)
+
+        temp_name = '%s.%d.tmp' % (self.file_name, os.getpid())
+
+        with config.open_private(temp_name) as index_file:
+            json.dump(self.load(), index_file, indent=1, sort_keys=True)
+
+        os.replace(temp_name, self.file_name)
+
+    def get(self, path: list):
+        return self.load().get(self.get_key(path))
+
+    def set(self, path: list, url: str):
+        self.load()[self.get_key(path)] = url
+
+    def build(self, menu: list, parents: list = None):
+        """
+        Add every item of a menu tree to the index.
+
+        :param menu: The menu items, as returned by nav.get_main_menu
+        :param parents: The titles of the items' parents
+        """
+        parents = parents or []
+
+        for item in menu:
+            path = parents + [item.title]
+
+            if item.url and not item.url.endswith('#') and not item.url.startswith('javascript:'):
+                self.set(path, item.url)
+
+            self.build(item.nodes, path)
@@ -1,7 +1,10 @@
+import contextlib
 import string
 import datetime
+import os
+import traceback
 
-from . import dom, security, common
+from . import dom, security, common, config, runtime
 
 from selenium.webdriver import ActionChains
 
@@ -11,7 +14,7 @@ from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import *
 from .common import ListFilterType
 
-ListCssFilters = {1: "list#%s']",
+ListCssFilters = {1: "list#%s",
                   2: "list[ng-model='%s']",
                   3: "list[lookup='%s']",
                   4: "list[placeholder='%s']",
@@ -19,20 +22,27 @@ ListCssFilters = {1: "list#%s']",
                   }
 
 
-def write_on_textbox(text: string, search_filter: string, by: By=By.CSS_SELECTOR):
+def write_on_textbox(text: string, search_filter: string, by: By=By.CSS_SELECTOR,
+                     entry: common.TextEntryType=None):
     """
     Write on a textbox element.
 
     :param text: The text to write
     :param search_filter: The element identifier to search by
     :param by: element filter type
+    :param entry: How the text is entered, see write_on_element
     """
+    if _record('write_on_textbox', (text, search_filter), 'type', (search_filter, by), text,
+               entry == common.TextEntryType.Keys):
+        return
+
     security.check_self()
     element = dom.get_element(search_filter, by)
-    write_on_element(text, element)
+    write_on_element(text, element, entry)
 
 
-def write_on_ng_textbox(text: str, model_name: str, element_tag: str='*', angular_prefix: str='ng'):
+def write_on_ng_textbox(text: str, model_name: str, element_tag: str='*', angular_prefix: str='ng',
+                        entry: common.TextEntryType=None):
     """
     Write on a textbox element using Angular model name.
 
@@ -41,28 +51,70 @@ def write_on_ng_textbox(text: str, model_name: str, element_tag: str='*', angula
     :param element_tag: The element's html tag
     :param angular_prefix: angular html data prefix
     :param element_tag: DOM element's tag
+    :param entry: How the text is entered, see write_on_element
     """
+    xpath = common.get_attr_xpath("//%s" % element_tag, "@%s-model" % angular_prefix, model_name,
+                                  common.TextSearchType.Exact)
+
+    if _record('write_on_ng_textbox', (text, model_name), 'type', (xpath, By.XPATH), text,
+               entry == common.TextEntryType.Keys):
+        return
+
     security.check_self()
     element = dom.get_element_by_angular_model(model_name, element_tag, angular_prefix)
-    write_on_element(text, element)
+    write_on_element(text, element, entry)
 
 
-def write_on_element(text: string, element: WebElement):
+def write_on_element(text: string, element: WebElement, entry: common.TextEntryType=None):
     """
+    Write on an element. The text is either typed key by key, or pasted: added to the element's value in
+    a single browser call that fires the 'input', 'change' and 'blur' events and reads the value back.
 
-    :rtype : object
+    :param text: The text to write
+    :param element: The element to write on
+    :param entry: Keys to type the text, Paste to paste it, Auto to paste it only when it's longer than the
+                  PasteThreshold setting or the element has no key handler. Defaults to the TextEntry setting.
+                  Texts with special keys, and elements with an input mask or a type-ahead, are always typed.
     """
     security.check_self()
+
+    if entry is None:
+        entry = _get_text_entry()
+
+    if entry != common.TextEntryType.Keys and isinstance(text, str) and not _has_special_keys(text):
+        result = runtime.call('enterText', element, text, entry.value, config.get_config().paste_threshold)
+
+        assert not result['error'], result['error']
+
+        if result['entered']:
+            assert result['value'] == result['expected'], \
+                "The element's value is '%s' instead of '%s' after pasting" % (result['value'], result['expected'])
+            return
+
     dom.validate_element(element)
     element.send_keys(text)
 
 
+def _get_text_entry() -> common.TextEntryType:
+    return common.TextEntryType[config.get_config().text_entry.strip().capitalize()]
+
+
+def _has_special_keys(text: str) -> bool:
+    # the Keys constants are in the unicode private use area
+    return any(u'\ue000' <= char <= u'\ue0ff' for char in text)
+
+
 def click_button(button_text: string, tag: str='button'):
     """
     Click on a button by its display text.
 
     :param button_text: The button's display text
     """
+    xpath = common.get_attr_xpath("//%s" % tag, 'normalize-space(text())', button_text)
+
+    if _record('click_button', (button_text,), 'click', (xpath, By.XPATH)):
+        return
+
     security.check_self()
 
     element = dom.get_element_by_text(button_text, tag)
@@ -75,6 +127,9 @@ def click_button_by_id(button_id: string):
 
     :param button_id: The button's id
     """
+    if _record('click_button_by_id', (button_id,), 'click', (button_id, By.CSS_SELECTOR)):
+        return
+
     security.check_self()
     element = dom.get_element(button_id)
     click_on_element(element)
@@ -90,10 +145,13 @@ def fill_textbox_by_label_text(label_text, value_for_textbox,
     """
     security.check_self()
 
-    # //input[@id=(//label[normalize-space(text())='%s']/@for)]
-    xpath = common.get_attr_xpath("//input[@id=(//label", "text()", label_text, search_type, "/@for)]")
+    if config.get_config().element_index:
+        text_box = dom.find_indexed('labelFor', label_text, search_type, 'input')
+    else:
+        # //input[@id=(//label[normalize-space(text())='%s']/@for)]
+        xpath = common.get_attr_xpath("//input[@id=(//label", "text()", label_text, search_type, "/@for)]")
 
-    text_box = dom.get_element(xpath, By.XPATH)
+        text_box = dom.get_element(xpath, By.XPATH)
 
     assert (text_box is not None), "Cannot find textbox with associated label's text '%s'" % label_text
 
@@ -124,8 +182,7 @@ def fill_text_boxes_by_labels_text(labels):
     :param labels: The textbox' label texts
     """
     security.check_self()
-    for label, textbox in labels.items():
-        fill_textbox_by_label_text(label, textbox)
+    fill_form(labels)
 
 
         # we should com this the function and the select2_set_value together
@@ -140,8 +197,46 @@ def fill_text_boxes_by_attribute_value(values: dict, attr_name: string='@placeho
     :param attr_name: The attribute name to filter with
     """
     security.check_self()
-    for attr_value, textbox in values.items():
-        fill_textbox_by_attribute_value(textbox, attr_value, attr_name)
+    fill_form(values, common.FieldFilterType.Attribute, attr_name=attr_name)
+
+
+_FIELD_BY = {common.FieldFilterType.Label: 'label',
+             common.FieldFilterType.Attribute: 'attribute',
+             common.FieldFilterType.Css: By.CSS_SELECTOR,
+             common.FieldFilterType.XPath: By.XPATH}
+
+
+def fill_form(values: dict, filter_type: common.FieldFilterType=common.FieldFilterType.Label,
+              search_type: common.TextSearchType=common.TextSearchType.Exact, attr_name: string='@placeholder',
+              keys: tuple=(), tag: string='input'):
+    """
+    Fill a series of fields in a single browser call. All the fields are found and checked to be displayed
+    and enabled first, then the text is added to each one's value, as typing it would, and the 'input',
+    'change' and 'blur' events AngularJS listens to are fired. Fields that need real keystrokes (listed in
+    keys, or having an input mask or type-ahead attribute) are typed into instead.
+
+    :param values: Dictionary of field filters with the corresponding text to write
+    :param filter_type: What the field filters are: the fields' label texts, the values of the attr_name
+                        attribute, css selectors or xpaths
+    :param search_type: How the label texts or attribute values are matched
+    :param attr_name: The attribute name, when filter_type is Attribute
+    :param keys: The field filters of the fields to type into
+    :param tag: The fields' html tag, when filter_type is Attribute
+    """
+    security.check_self()
+
+    filters = list(values.keys())
+    fields = [{'by': _FIELD_BY[filter_type], 'target': field_filter, 'mode': search_type.value,
+               'attribute': attr_name.lstrip('@'), 'tag': tag, 'value': str(values[field_filter]),
+               'keys': field_filter in keys}
+              for field_filter in filters]
+
+    missing, keyed = runtime.call('fillForm', fields)
+
+    assert not missing, "Cannot find textbox for %s" % ', '.join("'%s'" % filters[index] for index in missing)
+
+    for index, element in keyed:
+        write_on_element(values[filters[index]], element, common.TextEntryType.Keys)
 
 
 def select2_set_value(grayed_text: string, value: string):
@@ -153,9 +248,11 @@ def select2_set_value(grayed_text: string, value: string):
     security.check_self()
 
     selector = "//a/span[contains(.,'{0}')]/..".format(grayed_text)
-    all_elements = dom.get_elements(selector, By.XPATH)
 
-    all_visible = list(filter(lambda i: i.is_displayed(), all_elements))
+    if dom.select_widget_item(value, selector, By.XPATH, 'select2'):
+        return
+
+    all_visible = dom.get_visible_elements(selector, By.XPATH)
     # element_found = len(all_visible) == 1
 
     # assert (element_found, "Can not set text for multiple visible select")
@@ -164,7 +261,7 @@ def select2_set_value(grayed_text: string, value: string):
     selector = ".select2-drop-active > div > input"
     txt = dom.get_element(selector)
     txt.send_keys(value)
-    dom.wait(0.5)
+    dom.wait_for_angular()
     selector = ".select2-highlighted"
     click_element(selector)
 
@@ -179,9 +276,11 @@ def select2_set_value_ex(grayed_text: string, value: string):
 
     selector = "//div[contains(concat(' ',normalize-space(@class),' '),' list-placeholder ')]/span[text()='{0}']/..".format(
         grayed_text)
-    all_elements = dom.get_elements(selector, By.XPATH)
 
-    all_visible = list(filter(lambda i: i.is_displayed(), all_elements))
+    if dom.select_widget_item(value, selector, By.XPATH):
+        return
+
+    all_visible = dom.get_visible_elements(selector, By.XPATH)
     element_found = (len(all_visible) == 1)
     print(all_visible)
     assert element_found, "Can not set text for multiple visible select"
@@ -202,9 +301,10 @@ def select2_set_value_filter(value: string, search_filter: string, by: By=By.CSS
     """
     security.check_self()
 
-    all_elements = dom.get_elements(search_filter, by)
+    if dom.select_widget_item(value, search_filter, by):
+        return
 
-    all_visible = list(filter(lambda i: i.is_displayed(), all_elements))
+    all_visible = dom.get_visible_elements(search_filter, by)
     element_found = (len(all_visible) == 1)
     print(all_visible)
     assert element_found, "Can not set text for multiple visible select"
@@ -238,6 +338,10 @@ def set_list_value(value: str, list_filter: str, filter_type: ListFilterType=Lis
     :param filter_type: Type of the list filter
     """
     css = ListCssFilters[filter_type.value] % list_filter
+
+    if dom.select_widget_item(value, css, search_type=search_type):
+        return
+
     ele = dom.get_element(css)
 
     if ele:
@@ -254,6 +358,10 @@ def set_list_value(value: str, list_filter: str, filter_type: ListFilterType=Lis
 
 def set_select_value_by_text(place_holder_text: string, sel_text:string):
     xpath = "//list[@placeholder='%s']" % place_holder_text
+
+    if dom.select_widget_item(sel_text, xpath, By.XPATH):
+        return
+
     lst = dom.get_element(xpath, By.XPATH)
 
     if lst:
@@ -298,6 +406,9 @@ def click_element(search_filter: string, by: By=By.CSS_SELECTOR):
     :param search_filter: The element identifier to search by
     :param by: element filter type
     """
+    if _record('click_element', (search_filter,), 'click', (search_filter, by)):
+        return
+
     security.check_self()
     element = dom.get_element(search_filter, by)
     click_on_element(element)
@@ -312,6 +423,7 @@ def click_on_element(element_to_click: WebElement):
     security.check_self()
     # dom.validate_element(element_to_click)
     element_to_click.click()
+    common.get_session().clear_locators()
 
 
 def click_on_span_element(element_to_click: WebElement):
@@ -322,14 +434,15 @@ def click_on_span_element(element_to_click: WebElement):
     """
     security.check_self()
     # dom.validate_element(element_to_click)
-    ActionChains(common.browser).move_to_element(element_to_click).click().perform()
+    ActionChains(common.get_browser()).move_to_element(element_to_click).click().perform()
+    common.get_session().clear_locators()
 
 
 def hover_on_element(element_to_hover: WebElement):
     security.check_self()
     # assert (element_to_hover is not None)
     # assert element_to_hover.is_displayed() is True, "element is not displayed on the page"
-    ActionChains(common.browser).move_to_element(element_to_hover).perform()
+    ActionChains(common.get_browser()).move_to_element(element_to_hover).perform()
 
 
 def check_notification(message: string):
@@ -346,9 +459,9 @@ def close_notification():
     try:
         security.check_self()
         dom.wait_presence_of_element("close", by=By.CLASS_NAME)
-        dom.time.sleep(0.5)
+        dom.wait_for_angular()
         click_element("close", by=By.CLASS_NAME)
-        dom.time.sleep(1)
+        dom.wait_for_angular()
     finally:
         pass
 
@@ -419,3 +532,182 @@ def clear_select2_by_css(search_filter: string, by: By=By.CSS_SELECTOR):
     element = dom.get_element(search_filter, by)
     if element.is_displayed():
         click_on_element(element)
+
+
+class BatchActionError(WebDriverException):
+    """
+    A helper call recorded by input.batch failed when the batch ran.
+    """
+
+
+class Batch(object):
+    """
+    The helper calls recorded by input.batch, run together at the next synchronization point.
+    """
+
+    def __init__(self, mode: str='script'):
+        """
+        :param mode: 'script' to run the calls with a single runtime script, 'actions' to perform them as a
+                     single W3C actions sequence
+        """
+        self.mode = mode
+        self.actions = []
+
+    def record(self, helper: str, args: tuple, action: str, locator: tuple, text: str=None, keys: bool=False):
+        """
+        Record a helper call.
+
+        :param helper: The helper name
+        :param args: The helper's main arguments, to name the call in errors
+        :param action: 'click' or 'type'
+        :param locator: The (search_filter, by) of the element to act on
+        :param text: The text to type
+        :param keys: Type the text with real keystrokes
+        """
+        if text is not None:
+            text = str(text)
+            keys = keys or _has_special_keys(text)
+
+        self.actions.append({'call': '%s(%s)' % (helper, ', '.join(repr(arg) for arg in args)),
+                             'site': _get_call_site(), 'action': action, 'locator': list(locator),
+                             'text': text, 'keys': keys})
+
+    def flush(self):
+        """
+        Run the recorded calls. The first failing call raises a BatchActionError, the calls recorded after it
+        are dropped.
+        """
+        actions, self.actions = self.actions, []
+
+        if not actions:
+            return
+
+        security.check_self()
+
+        try:
+            if self.mode == 'actions':
+                self._perform(actions)
+            else:
+                self._run(actions)
+        finally:
+            # the recorded clicks may have changed the page
+            common.get_session().clear_locators()
+
+    @staticmethod
+    def _run(actions: list):
+        start = 0
+        entry = _get_text_entry()
+
+        while start < len(actions):
+            try:
+                result = runtime.call('runActions', [[action['action'], action['locator'], action['text'],
+                                                      action['keys']] for action in actions[start:]],
+                                      entry.value, config.get_config().paste_threshold)
+            except WebDriverException as e:
+                raise _get_batch_error(actions[start:], e.msg)
+
+            if result is None:
+                return
+
+            index = start + result['index']
+
+            if result['error']:
+                raise _get_batch_error(actions[index:index + 1], result['error'])
+
+            if result.get('clicked'):
+                # the click may have changed the route or re-rendered the view, the rest of the batch is found
+                # on the page the app settled on
+                common.get_session().clear_locators()
+                dom.wait_for_angular()
+            else:
+                # the text needs real keystrokes, type it and run the rest of the batch
+                try:
+                    result['element'].send_keys(actions[index]['text'])
+                except WebDriverException as e:
+                    raise _get_batch_error(actions[index:index + 1], e.msg)
+
+            start = index + 1
+
+    @staticmethod
+    def _perform(actions: list):
+        # the elements are all found before the sequence is performed, so they must all be on the page already
+        elements = runtime.call('findFirst', [action['locator'] for action in actions])
+        chain = ActionChains(common.get_browser())
+
+        for action, element in zip(actions, elements):
+            if element is None:
+                raise _get_batch_error([action], 'element not found')
+
+            if action['action'] == 'click':
+                chain.click(element)
+            else:
+                chain.send_keys_to_element(element, action['text'])
+
+        try:
+            chain.perform()
+        except WebDriverException as e:
+            raise _get_batch_error(actions, e.msg)
+
+
+@contextlib.contextmanager
+def batch(mode: str='script'):
+    """
+    Record the calls to click_element, click_button, click_button_by_id, write_on_textbox and
+    write_on_ng_textbox instead of running them one by one, and run them together: when the block ends,
+    or when any other helper is called (a synchronization point, as it may read the page). A failing call
+    raises a BatchActionError that names the call and where it was made from. Nested batches join the
+    outer one.
+
+        with input.batch():
+            input.write_on_textbox('Smith', '#lastName')
+            input.write_on_textbox('John', '#firstName')
+            input.click_button('Save')
+
+    :param mode: 'script' to run the calls with a single runtime script (clicks are DOM clicks, and texts are
+                 entered as set by the TextEntry setting, see write_on_element). A click, or a text to type
+                 key by key, splits the script: the calls after a click run once the app settled.
+                 'actions' to perform them as a single W3C actions sequence (the elements must all be on the
+                 page when the batch runs)
+    """
+    session = common.get_session()
+
+    if session.batch is not None:
+        yield session.batch
+        return
+
+    session.batch = Batch(mode)
+
+    try:
+        yield session.batch
+        session.batch.flush()
+    finally:
+        session.batch = None
+
+
+def _record(helper: str, args: tuple, action: str, locator: tuple, text: str=None, keys: bool=False) -> bool:
+    # record the call if a batch is open, the helper returns right away then
+    batch = common.get_session().batch
+
+    if batch is None:
+        return False
+
+    batch.record(helper, args, action, locator, text, keys)
+
+    return True
+
+
+def _get_call_site() -> str:
+    # the innermost frame outside of cyan
+    package_path = os.path.dirname(os.path.abspath(__file__))
+
+    for frame in reversed(traceback.extract_stack()):
+        if not os.path.abspath(frame.filename).startswith(package_path):
+            return '%s:%d' % (frame.filename, frame.lineno)
+
+    return 'unknown'
+
+
+def _get_batch_error(actions: list, error: str) -> BatchActionError:
+    calls = ', '.join('%s at %s' % (action['call'], action['site']) for action in actions)
+
+    return BatchActionError('%s failed: %s' % (calls, error))
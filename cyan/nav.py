@@ -1,16 +1,29 @@
+import atexit
+import hashlib
+import os
 import string
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.remote.webelement import WebElement
 
-from . import input, security, common, dom
+from . import input, security, common, config, dom, indexing, runtime
 
 
 class MenuItem(object):
-    def __init__(self, title, url):
+    __slots__ = ('title', 'url', 'nodes')
+
+    def __init__(self, title, url, nodes=None):
         self.title = title
         self.url = url
-        self.nodes = []
+        self.nodes = nodes or []
+
+    def __repr__(self):
+        return 'MenuItem(%r, %r, %d nodes)' % (self.title, self.url, len(self.nodes))
+
+    @classmethod
+    def from_json(cls, item: dict):
+        return cls(item['title'], item['url'], [cls.from_json(node) for node in item['nodes']])
 
 
 def go_home():
@@ -34,39 +47,90 @@ def refresh():
     Refresh current page
     """
     security.check_self()
-    common.browser.refresh()
+    common.get_session().invalidate()
+    common.get_browser().refresh()
 
 
-def go(url: string, is_route:bool=True):
+def go(url: string, is_route:bool=True, soft: bool=None):
     """
     Navigate to a specific Url.
 
-    :param url: The url to go to. It can a relative or absolute url.
+    :param url: The url to go to. It can a relative url, prefixed with the site url, or an absolute
+                http(s) url, gone to as it is.
+    :param soft: Change the route through the AngularJS app's $location, instead of reloading the whole app,
+                 when the url is a route of the app already open. The page is reloaded if the route change
+                 fails. Defaults to the SoftNavigation setting
     """
     security.check_self()
-    if not url.startswith(common.site_url):
+    if not url.startswith((common.site_url, 'http://', 'https://')):
         url = r"".join([common.site_url, url])
 
     if (not is_route):
         url = url.replace("/#","")
 
-    common.browser.get(url)
+    if soft is None:
+        soft = config.get_config().soft_navigation
+
+    common.get_session().invalidate()
+
+    if soft and go_soft(url):
+        return
+
+    common.get_browser().get(url)
+
+
+def go_soft(url: string, timer: float = None) -> bool:
+    """
+    Change the route of the AngularJS app already open in the browser, without reloading the page. It gives
+    up right away when AngularJS isn't running on the page.
+
+    :param url: The absolute url of the route
+    :param timer: Seconds to wait for the route change to settle, a reload is usually faster than a route
+                  change that doesn't settle quickly. Defaults to the SoftNavigationTimeout setting
+    :return: False if the url isn't a route of the open app, or the route change failed
+    """
+    base, _, route = url.partition('#')
+
+    if not route or common.get_browser().current_url.partition('#')[0] != base:
+        return False
+
+    if route.startswith('!'):
+        route = route[1:]
+
+    if timer is None:
+        timer = config.get_config().soft_navigation_timeout
 
+    try:
+        error = runtime.call_async('softGo', route or '/', timer, timeout=timer + 1)
+    except WebDriverException:
+        return False
 
-def multi_menu(menu_hierarchy: string, delimiter: string=","):
+    return error is None
+
+
+def multi_menu(menu_hierarchy: string, delimiter: string=",", fast: bool=None):
     """
     Click on a navigation menu item (work on multi levels menu)
     :param menu_hierarchy: The menu item hierarchy as string separated by delimiter
     :param delimiter: The delimiter that separate the menu items
+    :param fast: Go straight to the url the menu item opens, as found in the menu index, and only click
+                 through the menu when the path isn't indexed or its url is stale. Defaults to the FastMenu
+                 setting
     """
     security.check_self()
+    items = [item.strip() for item in menu_hierarchy.split(delimiter)]
+
+    if fast is None:
+        fast = config.get_config().fast_menu
+
+    if fast and go_menu_path(items):
+        return
+
     dom.wait_presence_of_element("mainMenu", By.ID)
-    items = menu_hierarchy.split(delimiter)
     last_index = len(items)
     index = 1
 
     for item in items:
-        item = item.strip()
         dom.wait_presence_of_element(item, By.LINK_TEXT)
 
         ele = dom.get_element(item, By.LINK_TEXT)
@@ -78,6 +142,81 @@ def multi_menu(menu_hierarchy: string, delimiter: string=","):
 
         index += 1
 
+    if fast:
+        menu_index = get_menu_index()
+        menu_index.set(items, get_current_url())
+        menu_index.save()
+
+
+def go_menu_path(items: list) -> bool:
+    """
+    Go to the url a menu path opens, as found in the menu index. The index is built from the main menu
+    when the path is missing, and an url that doesn't open any more is dropped.
+
+    :param items: The menu item titles, from the top level down
+    :return: False if the path couldn't be resolved to a working url
+    """
+    menu_index = get_menu_index()
+    url = menu_index.get(items)
+
+    if url is None:
+        menu_index.build(get_main_menu())
+        menu_index.save()
+        url = menu_index.get(items)
+
+    if url is None:
+        return False
+
+    go(url)
+    dom.wait_for_angular()
+
+    if not is_at(url):
+        menu_index.load().pop(menu_index.get_key(items), None)
+        menu_index.save()
+        return False
+
+    return True
+
+
+def is_at(url: string) -> bool:
+    """
+    Check the browser shows an url: the same page and, for a route of the AngularJS app, the same route.
+    A route the app doesn't know any more is redirected by the app, while the page's url stays the same.
+
+    :param url: The absolute url
+    """
+    base, _, route = url.partition('#')
+
+    if not get_current_url().startswith(base):
+        return False
+
+    if not route:
+        return True
+
+    if route.startswith('!'):
+        route = route[1:]
+
+    return runtime.call('currentRoute') == (route.partition('?')[0] or '/')
+
+
+_menu_index = None
+
+
+def get_menu_index() -> indexing.MenuIndex:
+    """
+    Get the menu index of the current site and version (SiteVersion setting).
+    """
+    global _menu_index
+
+    site_key = hashlib.sha1(common.site_url.encode('utf-8')).hexdigest()[:12]
+    file_name = os.path.join(config.get_project_path(), 'menus',
+                             '%s-%s.json' % (site_key, config.get_config().site_version))
+
+    if _menu_index is None or _menu_index.file_name != file_name:
+        _menu_index = indexing.MenuIndex(file_name)
+
+    return _menu_index
+
 
 def menu(parent_item: string, child_item: string):
     """
@@ -88,7 +227,7 @@ def menu(parent_item: string, child_item: string):
     """
     security.check_self()
     input.click_element(parent_item, by=By.LINK_TEXT)
-    dom.wait(0.5)
+    dom.wait_for_angular()
     input.click_element(child_item, by=By.LINK_TEXT)
 
 
@@ -110,42 +249,39 @@ def cascade_menu(parent_item, nameHover_item, child_item):
     parentCSS = '.nav-collapse.navbar-inverse-collapse .nav.navbar-nav li.dropdown a.dropdown-toggle'
 
     # Get the initial menu item
-    parentMenu = dom.get_elements(parentCSS)
-    elementParent = parentMenu[0]
-    for x in range(0, len(parentMenu)):
-        word = parentMenu[x].text
-        if word.upper() == parent_item.upper():
-            elementParent = parentMenu[x]
+    parentMenu = dom.extract(parentCSS, ('text', 'element'))
+    elementParent = parentMenu[0]['element']
+    for item in parentMenu:
+        if item['text'].upper() == parent_item.upper():
+            elementParent = item['element']
             break
 
     # Get the hover items
-    hover_item = dom.get_elements(CSSHover_item)
-    subMenu = hover_item[0]
-    for x in range(0, len(hover_item)):
-        word = hover_item[x]
-        wordResult = word.get_attribute("textContent")
+    hover_item = dom.extract(CSSHover_item, ('textContent', 'element'))
+    subMenu = hover_item[0]['element']
+    for item in hover_item:
+        wordResult = item['textContent']
         if nameHover_item in wordResult:
             if child_item in wordResult:
-                subMenu = hover_item[x]
+                subMenu = item['element']
                 break
 
     # get the final click
-    allFinalItems = dom.get_elements(finalResult)
-    elementChild = allFinalItems[0]
+    allFinalItems = dom.extract(finalResult, ('textContent', 'element'))
+    elementChild = allFinalItems[0]['element']
     expectedResult = child_item.replace(" ", "")
 
     # Get the final menu item
-    for x in range(0, len(allFinalItems)):
-        textResult = allFinalItems[x].get_attribute("textContent")
-        textResults1 = textResult.replace(" ", "")
+    for item in allFinalItems:
+        textResults1 = item['textContent'].replace(" ", "")
         textResults2 = textResults1.replace("\n", "")
 
         if textResults2.upper() == expectedResult.upper():
-            elementChild = allFinalItems[x]
+            elementChild = item['element']
             break
 
     # preform the result
-    hover = ActionChains(common.browser)
+    hover = ActionChains(common.get_browser())
     hover.click(elementParent)
     hover.move_to_element(subMenu)
     hover.click(elementChild)
@@ -168,30 +304,28 @@ def menu_CSS(parent_item: string, child_item: string):
     childCSS = '.navbar-nav li.dropdown ul.dropdown-menu>li:not(.dropdown-submenu) a'
 
     # get the child
-    allFinalItems = dom.get_elements(childCSS)
-    elementChild = allFinalItems[0]
+    allFinalItems = dom.extract(childCSS, ('textContent', 'element'))
+    elementChild = allFinalItems[0]['element']
     expectedResult = child_item.replace(" ", "")
 
-    for x in range(0, len(allFinalItems)):
-        textResult = allFinalItems[x].get_attribute("textContent")
-        textResults = textResult.replace(" ", "")
+    for item in allFinalItems:
+        textResults = item['textContent'].replace(" ", "")
         textResults = textResults.replace("\n", "")
 
         if textResults.upper() == expectedResult.upper():
-            elementChild = allFinalItems[x]
+            elementChild = item['element']
             break
 
     # Get the 1st Item from the text
-    parentMenu = dom.get_elements(parentCSS)
-    elementParent = parentMenu[0]
-    for x in range(0, len(parentMenu)):
-        word = parentMenu[x].text
-        if word == parent_item:
-            elementParent = parentMenu[x]
+    parentMenu = dom.extract(parentCSS, ('text', 'element'))
+    elementParent = parentMenu[0]['element']
+    for item in parentMenu:
+        if item['text'] == parent_item:
+            elementParent = item['element']
             break
 
     # Hover on to the 2nd menu item
-    hover = ActionChains(common.browser)
+    hover = ActionChains(common.get_browser())
     hover.click(elementParent)
     hover.click(elementChild)
     hover.perform()
@@ -204,14 +338,8 @@ def get_menu_options(parent_item: string):
     :param parent_item:
     :return:
     """
-    menuItems = list()
     input.click_element(parent_item, by=By.LINK_TEXT)
-    children = dom.get_elements(".dropdown.open li")
-    length = len(children)
-    for x in range(0, length):
-        item = children[x].text
-        if item:
-            menuItems.append(item)
+    menuItems = [item for item in dom.extract(".dropdown.open li", 'text') if item]
     return menuItems
 
 
@@ -222,17 +350,8 @@ def get_all_menu_options(parent_item: string):
     :param parent_item:
     :return:
     """
-    menuItems = list()
     input.click_element(parent_item, by=By.LINK_TEXT)
-    children = dom.get_elements('a[href^="/Merchandising"]')
-
-    length = len(children)
-    for x in range(0, length):
-        item = children[x].get_attribute('innerHTML')
-        if item:
-            menuItems.append(item)
-        else:
-            aaa = 0  # Is there a sub menu
+    menuItems = [item for item in dom.extract('a[href^="/Merchandising"]', 'innerHTML') if item]
     return menuItems
 
 
@@ -251,46 +370,92 @@ def quit_browser():
     # global browser
     # global checking
 
-    if common.browser:
-        common.browser.quit()
+    if common.get_browser():
+        common.get_browser().quit()
+
+    common.get_session().checking = False
+    common.get_session().classes_run = 0
+    common.get_session().user = None
+    common.get_session().invalidate()
+    common.set_browser(None)
+
 
-    common.checking = False
-    common.browser = None
+def reset_browser():
+    """
+    Make the current browser ready for the next test class instead of quitting it: close the extra
+    windows, clear cookies and web storage if common.reset_storage is set, and go to the site's home.
+    The browser is quit instead once it served common.recycle_after test classes, or when it doesn't
+    respond.
+    """
+    session = common.get_session()
+    browser = session.browser
 
+    if browser is None:
+        return
 
-def get_main_menu() -> list:
-    menu_list = []
-    parent_menu = dom.get_elements("#mainMenu > li")
+    session.classes_run += 1
 
-    if not parent_menu:
-        return menu_list
+    if session.classes_run >= common.recycle_after:
+        quit_browser()
+        return
 
-    for sub_menu in parent_menu:
-        menu_item = get_menu_item(sub_menu)
-        menu_list.append(menu_item)
+    try:
+        handles = browser.window_handles
 
-    return menu_list
+        for handle in handles[1:]:
+            browser.switch_to.window(handle)
+            browser.close()
 
+        browser.switch_to.window(handles[0])
 
-def get_menu_item(ele: WebElement) -> MenuItem:
+        if common.reset_storage:
+            browser.delete_all_cookies()
+            browser.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            session.checking = False
+            session.user = None
+
+        common.get_session().invalidate()
+        browser.get(common.site_url)
+    except (WebDriverException, IndexError, ConnectionError):
+        quit_browser()
+
+
+# a browser kept by reset_browser outlives the last test class, quit it when the process ends
+atexit.register(quit_browser)
+
+
+def get_main_menu(role: str = None, refresh: bool = False) -> list:
     """
+    Get the main menu tree, read from the page in a single browser call. The tree is cached per
+    user and role for the session.
 
-    :param ele:
-    :return:
+    :param role: The role the current user acts as, when the menu differs between roles
+    :param refresh: Read the menu from the page even if it's cached
+    :return: The top level MenuItems
     """
-    url = ele.find_element_by_tag_name('a')
+    security.check_self()
+
+    session = common.get_session()
+    key = (common.site_url, session.user, role)
+
+    if refresh or key not in session.menus:
+        tree = runtime.call('menuTree', None)
+        session.menus[key] = [MenuItem.from_json(item) for item in tree]
+
+    return session.menus[key]
 
-    menu_title = url.text
-    menu_url = url.get_attribute('href')
-    menu_item = MenuItem(menu_title, menu_url)
-    nodes = ele.find_elements_by_css_selector("ul > li")
 
-    for node in nodes:
-        sub_menu = get_menu_item(node)
-        menu_item.nodes.append(sub_menu)
+def get_menu_item(ele: WebElement) -> MenuItem:
+    """
+    Get the menu tree under a menu's 'li' element, in a single browser call.
+
+    :param ele: The menu 'li' element
+    :return: The menu item
+    """
+    tree = runtime.call('menuTree', ele)
 
-    return menu_item
+    return MenuItem.from_json(tree[0])
 
 
 def get_current_url():
-    return common.browser.current_url
+    return common.get_browser().current_url
@@ -0,0 +1,109 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module contains a pool of pre-launched browsers, so several tests can run at the same
+    time in one process. Each test borrows a browser through 'lease', which binds it as the
+    current session of the calling thread; all the helpers in dom, input, nav and security then
+    drive that browser instead of the global one.
+
+    Example::
+
+        pool = BrowserPool(4).start()
+
+        with pool.lease():
+            nav.go('#/Warranty')
+
+    ---------------------------------------------------------------------
+"""
+
+from contextlib import contextmanager
+import queue
+import threading
+
+from . import common, security
+
+
+class BrowserPool(object):
+    def __init__(self, size: int=1, factory=None):
+        """
+        :param size: Number of browsers to keep in the pool
+        :param factory: Callable that launches a new web driver, defaults to security.create_browser
+        """
+        self.size = size
+        self.factory = factory or security.create_browser
+        self._idle = queue.Queue()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """
+        Launch the browsers of the pool.
+
+        :return: The pool itself
+        """
+        with self._lock:
+            while len(self._sessions) < self.size:
+                session = common.Session(self.factory())
+                self._sessions.append(session)
+                self._idle.put(session)
+
+        return self
+
+    def acquire(self, timeout: float=None) -> common.Session:
+        """
+        Borrow a session from the pool, waiting for one to be released if all are busy.
+
+        :param timeout: Seconds to wait before raising queue.Empty, None waits forever
+        :return: The borrowed session
+        """
+        return self._idle.get(timeout=timeout)
+
+    def release(self, session: common.Session):
+        """
+        Give a session back to the pool, with the state the test left in it reset. A browser that was quit
+        while borrowed is relaunched.
+
+        :param session: The session to give back
+        """
+        session.reset()
+
+        if session.browser is None:
+            session.browser = self.factory()
+
+        self._idle.put(session)
+
+    @contextmanager
+    def lease(self, timeout: float=None):
+        """
+        Borrow a session and bind it to the current thread for the duration of the block.
+
+        :param timeout: Seconds to wait for a free session
+        """
+        session = self.acquire(timeout)
+        common.bind_session(session)
+
+        try:
+            yield session
+        finally:
+            common.bind_session(None)
+            self.release(session)
+
+    def close(self):
+        """
+        Quit all the browsers of the pool.
+        """
+        with self._lock:
+            for session in self._sessions:
+                if session.browser:
+                    session.browser.quit()
+
+                session.browser = None
+
+            self._sessions = []
+            self._idle = queue.Queue()
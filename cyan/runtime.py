@@ -0,0 +1,946 @@
+"""
+    ---------------------------------------------------------------------
+
+    This module contains the in-page runtime of cyan: the JavaScript the helpers run in the browser to
+    find, query, wait for and extract elements, scroll, and drive the AngularJS app.
+
+    The runtime is injected once per document as window.__cyan, and the helpers call its functions by
+    name, so a call only sends the function name and its arguments. A document that has no runtime, or
+    the runtime of another cyan version (a new page, a page loaded after a navigation, a browser shared
+    through the daemon), makes the call return a 'missing' marker; the call is then sent again with the
+    runtime prepended, which injects it and runs the function in a second round trip. The calls that
+    follow on the same document take a single round trip.
+
+    ---------------------------------------------------------------------
+"""
+
+import hashlib
+
+from selenium.common.exceptions import StaleElementReferenceException
+
+from . import common
+
+
+_RUNTIME_JS = """
+    window.__cyan = (function (version) {
+        function quoted(value) {
+            return '"' + String(value).replace(/\\\\/g, '\\\\\\\\').replace(/"/g, '\\\\"') + '"';
+        }
+
+        // finds the elements matching a (by, selector) locator, the same way the driver does
+        function find(by, selector, root) {
+            root = root || document;
+            var found = [], i, nodes;
+
+            switch (by) {
+                case 'css selector':
+                    return Array.prototype.slice.call(root.querySelectorAll(selector));
+                case 'id':
+                    return Array.prototype.slice.call(root.querySelectorAll('[id=' + quoted(selector) + ']'));
+                case 'name':
+                    return Array.prototype.slice.call(root.querySelectorAll('[name=' + quoted(selector) + ']'));
+                case 'class name':
+                    return Array.prototype.slice.call(root.getElementsByClassName(selector));
+                case 'tag name':
+                    return Array.prototype.slice.call(root.getElementsByTagName(selector));
+                case 'xpath':
+                    nodes = document.evaluate(selector, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+                    for (i = 0; i < nodes.snapshotLength; i++) {
+                        if (nodes.snapshotItem(i).nodeType === 1) found.push(nodes.snapshotItem(i));
+                    }
+                    return found;
+                case 'link text':
+                case 'partial link text':
+                    nodes = root.getElementsByTagName('a');
+                    for (i = 0; i < nodes.length; i++) {
+                        var text = (nodes[i].innerText || nodes[i].textContent || '').trim();
+                        if (by === 'link text' ? text === selector : text.indexOf(selector) >= 0) found.push(nodes[i]);
+                    }
+                    return found;
+            }
+
+            throw new Error('Unsupported locator strategy: ' + by);
+        }
+
+        function isVisible(element) {
+            if (!element.isConnected) return false;
+
+            var style = window.getComputedStyle(element);
+            if (style.visibility === 'hidden' || style.visibility === 'collapse') return false;
+
+            for (var node = element; node && node.nodeType === 1; node = node.parentElement) {
+                var nodeStyle = window.getComputedStyle(node);
+                if (nodeStyle.display === 'none' || nodeStyle.opacity === '0') return false;
+            }
+
+            if (element.tagName === 'OPTION' || element.tagName === 'OPTGROUP') {
+                var select = element.closest('select');
+                return !select || isVisible(select);
+            }
+
+            var rect = element.getBoundingClientRect();
+            return rect.width > 0 && rect.height > 0;
+        }
+
+        function text(element) {
+            return isVisible(element) ? (element.innerText || '').trim() : '';
+        }
+
+        function isEnabled(element) {
+            return !(element.matches && element.matches(':disabled'));
+        }
+
+        function value(element) {
+            return element.value === undefined ? element.getAttribute('value') : element.value;
+        }
+
+        function read(element, field) {
+            switch (field) {
+                case 'element': return element;
+                case 'text': return text(element);
+                case 'textContent': return element.textContent;
+                case 'innerHTML': return element.innerHTML;
+                case 'outerHTML': return element.outerHTML;
+                case 'value': return value(element);
+                case 'visible': return isVisible(element);
+                case 'href': return element.href === undefined ? element.getAttribute('href') : element.href;
+            }
+            return element.getAttribute(field);
+        }
+
+        function getInjector() {
+            var root = document.querySelector('[ng-app], [data-ng-app], .ng-scope') || document.body;
+
+            return {root: root, injector: window.angular ? angular.element(root).injector() : null};
+        }
+
+        function queryStates(locators) {
+            var states = [];
+
+            for (var i = 0; i < locators.length; i++) {
+                var element = find(locators[i][1], locators[i][0])[0];
+
+                if (!element) {
+                    states.push(null);
+                    continue;
+                }
+
+                var selectable = element.tagName === 'OPTION' || element.type === 'checkbox' || element.type === 'radio';
+
+                states.push([
+                    isVisible(element),
+                    isEnabled(element),
+                    selectable ? !!(element.selected || element.checked) : false,
+                    text(element),
+                    value(element)
+                ]);
+            }
+
+            return states;
+        }
+
+        function extract(selector, by, fields) {
+            var elements = find(by, selector), rows = [];
+
+            for (var i = 0; i < elements.length; i++) {
+                var row = [];
+                for (var j = 0; j < fields.length; j++) row.push(read(elements[i], fields[j]));
+                rows.push(row);
+            }
+
+            return rows;
+        }
+
+        // waits for a condition on an element, re-checked on every DOM mutation (and on a slow timer,
+        // as CSS transitions change the visibility without any mutation)
+        function waitFor(locator, condition, expected, timeout, done) {
+            var finished = false, observer, poll, timer;
+
+            function check() {
+                var element = find(locator[1], locator[0])[0];
+
+                switch (condition) {
+                    case 'present': return !!element;
+                    case 'visible': return !!element && isVisible(element);
+                    case 'invisible': return !element || !isVisible(element);
+                    case 'enabled': return !!element && isEnabled(element);
+                    case 'text': return !!element && text(element) === expected;
+                }
+
+                throw new Error('Unknown wait condition: ' + condition);
+            }
+
+            function finish(result) {
+                if (finished) return;
+                finished = true;
+                if (observer) observer.disconnect();
+                clearInterval(poll);
+                clearTimeout(timer);
+                done(result);
+            }
+
+            function recheck() {
+                try {
+                    if (check()) finish(true);
+                } catch (e) {
+                    finish(String(e));
+                }
+            }
+
+            recheck();
+
+            if (!finished) {
+                observer = new MutationObserver(recheck);
+                observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+                poll = setInterval(recheck, 250);
+                timer = setTimeout(function () { finish(false); }, timeout * 1000);
+            }
+        }
+
+        function waitForAngular(done) {
+            try {
+                var app = getInjector();
+
+                if (!window.angular) return done('AngularJS is not running on the page');
+
+                if (angular.getTestability) {
+                    angular.getTestability(app.root).whenStable(function () { done(null); });
+                } else {
+                    if (!app.injector) return done('AngularJS is not bootstrapped');
+
+                    app.injector.get('$browser').notifyWhenNoOutstandingRequests(function () { done(null); });
+                }
+            } catch (e) {
+                done(String(e));
+            }
+        }
+
+        // changes the route through $location, then waits for the route change and the app's pending requests
+        function softGo(route, timeout, done) {
+            var finished = false, listeners = [];
+
+            function finish(error) {
+                if (finished) return;
+                finished = true;
+                for (var i = 0; i < listeners.length; i++) listeners[i]();
+                done(error);
+            }
+
+            try {
+                var injector = getInjector().injector;
+
+                if (!injector) return done('AngularJS is not running on the page');
+
+                var $location = injector.get('$location'), $rootScope = injector.get('$rootScope');
+                var $browser = injector.get('$browser');
+
+                var settle = function () {
+                    $browser.notifyWhenNoOutstandingRequests(function () { finish(null); });
+                };
+
+                ['$routeChangeSuccess', '$stateChangeSuccess'].forEach(function (name) {
+                    listeners.push($rootScope.$on(name, settle));
+                });
+                ['$routeChangeError', '$stateChangeError', '$stateNotFound'].forEach(function (name) {
+                    listeners.push($rootScope.$on(name, function () { finish('route change failed: ' + name); }));
+                });
+
+                if ($location.url() === route) {
+                    if (injector.has('$route')) {
+                        $rootScope.$apply(function () { injector.get('$route').reload(); });
+                    } else {
+                        return finish('the route is already open and there is no $route to reload it');
+                    }
+                } else {
+                    $rootScope.$apply(function () { $location.url(route); });
+                }
+
+                setTimeout(function () { finish('route change timed out'); }, timeout * 1000);
+            } catch (e) {
+                finish(String(e));
+            }
+        }
+
+        // the path of the route the AngularJS app shows, read from the url's hash when AngularJS isn't running
+        function currentRoute() {
+            var injector = getInjector().injector;
+
+            if (injector && injector.has('$location')) return injector.get('$location').path();
+
+            return location.hash.replace(/^#!?/, '').split('?')[0];
+        }
+
+        // builds the menu tree under each root 'li', a node's children are the 'li' items of its sub menu
+        function menuTree(root) {
+            function readItem(li) {
+                var link = li.getElementsByTagName('a')[0], nodes = [];
+                var items = li.querySelectorAll('ul > li');
+
+                for (var i = 0; i < items.length; i++) {
+                    if (items[i].parentElement.closest('li') === li) nodes.push(readItem(items[i]));
+                }
+
+                return {
+                    title: link ? link.textContent.replace(/\\s+/g, ' ').trim() : '',
+                    url: link ? link.href || null : null,
+                    nodes: nodes
+                };
+            }
+
+            var roots = root ? [root] : document.querySelectorAll('#mainMenu > li'), tree = [];
+
+            for (var i = 0; i < roots.length; i++) tree.push(readItem(roots[i]));
+
+            return tree;
+        }
+
+        // the elements by their own text and by the attributes the lookups use, built on the first lookup and
+        // kept up to date by a MutationObserver. Entries of removed or changed elements are dropped when a
+        // lookup meets them, and the index is rebuilt once they outnumber the live ones.
+        var INDEXED_ATTRIBUTES = ['ng-model', 'data-ng-model', 'placeholder', 'name'];
+        var index = null;
+
+        function normalize(value) {
+            return String(value).replace(/\\s+/g, ' ').trim();
+        }
+
+        function ownText(element) {
+            var parts = [];
+
+            for (var node = element.firstChild; node; node = node.nextSibling) {
+                if (node.nodeType === 3) parts.push(node.nodeValue);
+            }
+
+            return normalize(parts.join(' '));
+        }
+
+        function getKey(element, kind) {
+            return kind === 'text' ? ownText(element) : element.getAttribute(kind);
+        }
+
+        function indexElement(element) {
+            var kinds = ['text'].concat(INDEXED_ATTRIBUTES);
+
+            for (var i = 0; i < kinds.length; i++) {
+                var key = getKey(element, kinds[i]);
+                if (!key) continue;
+
+                var elements = index.maps[kinds[i]].get(key);
+                if (!elements) index.maps[kinds[i]].set(key, elements = new Set());
+
+                if (!elements.has(element)) {
+                    elements.add(element);
+                    index.size++;
+                }
+            }
+        }
+
+        function indexTree(root) {
+            if (root.nodeType !== 1) return;
+
+            indexElement(root);
+
+            var elements = root.getElementsByTagName('*');
+            for (var i = 0; i < elements.length; i++) indexElement(elements[i]);
+        }
+
+        function onMutations(mutations) {
+            for (var i = 0; i < mutations.length && index; i++) {
+                var mutation = mutations[i];
+
+                if (mutation.type === 'childList') {
+                    for (var j = 0; j < mutation.addedNodes.length; j++) indexTree(mutation.addedNodes[j]);
+                    // adding or removing a text node changes its parent's own text
+                    if (mutation.target.nodeType === 1) indexElement(mutation.target);
+                } else if (mutation.type === 'characterData') {
+                    if (mutation.target.parentElement) indexElement(mutation.target.parentElement);
+                } else {
+                    indexElement(mutation.target);
+                }
+            }
+
+            if (index && index.size > index.limit) {
+                index.observer.disconnect();
+                index = null;
+            }
+        }
+
+        function getIndex() {
+            if (index) return index;
+
+            index = {maps: {text: new Map()}, size: 0, observer: new MutationObserver(onMutations)};
+            for (var i = 0; i < INDEXED_ATTRIBUTES.length; i++) index.maps[INDEXED_ATTRIBUTES[i]] = new Map();
+
+            indexTree(document.documentElement);
+            index.limit = index.size * 2 + 1000;
+            index.observer.observe(document, {childList: true, subtree: true, characterData: true,
+                                              attributes: true, attributeFilter: INDEXED_ATTRIBUTES});
+
+            return index;
+        }
+
+        function matches(key, value, mode) {
+            switch (mode) {
+                case 1: return key === value;
+                case 2: return key.indexOf(value) === 0;
+                case 3: return key.length >= value.length && key.lastIndexOf(value) === key.length - value.length;
+                case 4: return key.indexOf(value) >= 0;
+            }
+
+            throw new Error('Unknown text search type: ' + mode);
+        }
+
+        // the indexed elements whose text or attribute matches the value, in document order
+        function lookupAll(kind, value, mode, tag) {
+            var map = getIndex().maps[kind], found = [];
+
+            if (!map) throw new Error('Not an indexed lookup: ' + kind);
+
+            value = kind === 'text' ? normalize(value) : String(value);
+            tag = tag && tag !== '*' ? tag.toUpperCase() : null;
+
+            function collect(elements, key) {
+                elements.forEach(function (element) {
+                    if (!element.isConnected || getKey(element, kind) !== key) {
+                        elements.delete(element);
+                        index.size--;
+                    } else if (!tag || element.tagName.toUpperCase() === tag) {
+                        found.push(element);
+                    }
+                });
+
+                if (!elements.size) map.delete(key);
+            }
+
+            if (mode === 1) {
+                if (map.has(value)) collect(map.get(value), value);
+            } else {
+                map.forEach(function (elements, key) {
+                    if (matches(key, value, mode)) collect(elements, key);
+                });
+            }
+
+            return found.sort(function (a, b) {
+                return a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1;
+            });
+        }
+
+        // the first indexed element matching the value, 'labelFor' looks up a label by its text and
+        // returns the element the label is for
+        function lookup(kind, value, mode, tag) {
+            if (kind !== 'labelFor') return lookupAll(kind, value, mode, tag)[0] || null;
+
+            var labels = lookupAll('text', value, mode, 'label');
+
+            for (var i = 0; i < labels.length; i++) {
+                var target = labels[i].htmlFor && document.getElementById(labels[i].htmlFor);
+
+                if (target && (!tag || tag === '*' || target.tagName.toUpperCase() === tag.toUpperCase())) return target;
+            }
+
+            return null;
+        }
+
+        // the first item of the list following a facet's label that contains the value
+        function facet(name, value) {
+            var labels = lookupAll('text', name, 1, 'label');
+
+            for (var i = 0; i < labels.length; i++) {
+                var items = document.evaluate('following::ul[1]/li', labels[i], null,
+                                              XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+
+                for (var j = 0; j < items.snapshotLength; j++) {
+                    if (items.snapshotItem(j).textContent.indexOf(value) >= 0) return items.snapshotItem(j);
+                }
+            }
+
+            return null;
+        }
+
+        // the elements that need real keystrokes: input masks and type-aheads react to key events only
+        var KEYED_ATTRIBUTES = ['ui-mask', 'mask', 'typeahead', 'uib-typeahead', 'bs-typeahead'];
+        var KEY_HANDLER_ATTRIBUTES = ['onkeydown', 'onkeypress', 'onkeyup', 'ng-keydown', 'ng-keypress', 'ng-keyup'];
+        var CSS_OPERATORS = {1: '=', 2: '^=', 3: '$=', 4: '*='};
+
+        function hasAttribute(element, names) {
+            return names.some(function (name) {
+                return element.hasAttribute(name) || element.hasAttribute('data-' + name);
+            });
+        }
+
+        function findField(field, labels) {
+            switch (field.by) {
+                case 'label':
+                    for (var i = 0; i < labels.length; i++) {
+                        if (!matches(labels[i][0], normalize(field.target), field.mode)) continue;
+
+                        var target = labels[i][1].htmlFor && document.getElementById(labels[i][1].htmlFor);
+                        if (target && (target.tagName === 'INPUT' || target.tagName === 'TEXTAREA')) return target;
+                    }
+                    return null;
+                case 'attribute':
+                    return document.querySelector(field.tag + '[' + field.attribute + CSS_OPERATORS[field.mode] +
+                                                  quoted(field.target) + ']');
+            }
+
+            return find(field.by, field.target)[0] || null;
+        }
+
+        function setValue(element, value) {
+            var prototype = element.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype :
+                            element.tagName === 'SELECT' ? HTMLSelectElement.prototype : HTMLInputElement.prototype;
+
+            // the native setter, as frameworks may wrap the element's own
+            Object.getOwnPropertyDescriptor(prototype, 'value').set.call(element, value);
+
+            element.dispatchEvent(new Event('input', {bubbles: true}));
+            element.dispatchEvent(new Event('change', {bubbles: true}));
+            element.dispatchEvent(new FocusEvent('blur'));
+            element.dispatchEvent(new FocusEvent('focusout', {bubbles: true}));
+        }
+
+        // adds the text to the element's value, as typing it would, and returns the expected value
+        function appendValue(element, text) {
+            var expected = element.value + text;
+            if (element.maxLength >= 0) expected = expected.substring(0, element.maxLength);
+
+            setValue(element, expected);
+
+            return expected;
+        }
+
+        // adds the text to the element's value in one step (mode 2), or only when the text is longer than the
+        // threshold or the element has no key handler (mode 3), then reads the value back. Elements with an input
+        // mask or a type-ahead, and line breaks in an input, are always left to be typed
+        function enterText(element, text, mode, threshold) {
+            if (!isVisible(element)) return {entered: false, error: 'element is not displayed on the page'};
+            if (!isEnabled(element)) return {entered: false, error: 'element is not enabled'};
+
+            var typed = !('value' in element) || element.readOnly || hasAttribute(element, KEYED_ATTRIBUTES) ||
+                        (element.tagName === 'INPUT' && /[\\r\\n]/.test(text));
+            var handled = hasAttribute(element, KEY_HANDLER_ATTRIBUTES) ||
+                          !!(element.onkeydown || element.onkeypress || element.onkeyup);
+
+            if (typed || (mode === 3 && text.length <= threshold && handled)) return {entered: false, error: null};
+
+            var expected = appendValue(element, text);
+
+            return {entered: true, error: null, expected: expected, value: element.value};
+        }
+
+        // the first element matching each locator, or null
+        function findFirst(locators) {
+            return locators.map(function (locator) { return find(locator[1], locator[0])[0] || null; });
+        }
+
+        // runs recorded input actions ([action, locator, text, keys]) in order, the texts are entered the way
+        // enterText does with the given mode and threshold. It stops at the first failing one, at the first text
+        // to type with real keystrokes, or after the first click (it may change the route or re-render the view,
+        // the actions after it are run by a new call once the app settled), and returns its
+        // {index, error, element, clicked}
+        function runActions(actions, mode, threshold) {
+            for (var i = 0; i < actions.length; i++) {
+                var action = actions[i], element = find(action[1][1], action[1][0])[0];
+
+                if (!element) return {index: i, error: 'element not found', element: null};
+                if (!isVisible(element)) return {index: i, error: 'element is not displayed on the page', element: null};
+                if (!isEnabled(element)) return {index: i, error: 'element is not enabled', element: null};
+
+                if (action[0] === 'click') {
+                    element.click();
+                    return {index: i, error: null, element: null, clicked: true};
+                }
+
+                if (action[3] || mode === 1) return {index: i, error: null, element: element};
+
+                var result = enterText(element, action[2], mode, threshold);
+
+                if (result.error) return {index: i, error: result.error, element: null};
+                if (!result.entered) return {index: i, error: null, element: element};
+
+                if (result.value !== result.expected) {
+                    return {index: i, error: "The element's value is '" + result.value + "' instead of '" +
+                                             result.expected + "' after pasting", element: null};
+                }
+            }
+
+            return null;
+        }
+
+        // fills the fields in one go once all of them are found, displayed and enabled. Returns the indexes of the
+        // fields not found (nothing is filled then), and the [index, element] of the fields to type into
+        function fillForm(fields) {
+            var labels = [], elements = [], missing = [], keyed = [], i;
+
+            if (fields.some(function (field) { return field.by === 'label'; })) {
+                var nodes = document.getElementsByTagName('label');
+                for (i = 0; i < nodes.length; i++) labels.push([ownText(nodes[i]), nodes[i]]);
+            }
+
+            for (i = 0; i < fields.length; i++) {
+                elements.push(findField(fields[i], labels));
+                if (!elements[i]) missing.push(i);
+            }
+
+            if (missing.length) return [missing, keyed];
+
+            for (i = 0; i < fields.length; i++) {
+                if (!isVisible(elements[i])) throw new Error("The field '" + fields[i].target + "' is not displayed on the page");
+                if (!isEnabled(elements[i])) throw new Error("The field '" + fields[i].target + "' is not enabled");
+            }
+
+            for (i = 0; i < fields.length; i++) {
+                if (fields[i].keys || hasAttribute(elements[i], KEYED_ATTRIBUTES)) {
+                    keyed.push([i, elements[i]]);
+                } else {
+                    appendValue(elements[i], fields[i].value);
+                }
+            }
+
+            return [missing, keyed];
+        }
+
+        // the widgets' options are either plain values, or objects such as {k: key, v: text}
+        var OPTION_TEXT_FIELDS = ['v', 'text', 'label', 'name', 'description', 'value'];
+        var OPTION_VALUE_FIELDS = ['k', 'id', 'key', 'value'];
+
+        function optionText(option) {
+            if (option === null || typeof option !== 'object') return option === undefined ? null : String(option);
+
+            for (var i = 0; i < OPTION_TEXT_FIELDS.length; i++) {
+                var field = option[OPTION_TEXT_FIELDS[i]];
+                if (typeof field === 'string' || typeof field === 'number') return String(field);
+            }
+
+            return null;
+        }
+
+        function optionValue(option) {
+            if (option === null || typeof option !== 'object') return option;
+
+            for (var i = 0; i < OPTION_VALUE_FIELDS.length; i++) {
+                if (OPTION_VALUE_FIELDS[i] in option) return option[OPTION_VALUE_FIELDS[i]];
+            }
+
+            return option;
+        }
+
+        var LIST_OPTION_BINDINGS = ['options', 'items'];
+
+        // the options of a 'list' widget: its 'options' (or 'items') attribute evaluated on the widget's scope, else
+        // the same binding on the directive's isolate scope. An array, or a key to text map, of option-like values.
+        // Throws when the widget has no such binding, the caller has to click through the widget then
+        function findOptions($widget) {
+            var widget = $widget[0], isolate = $widget.isolateScope(), candidate, found = false, i;
+
+            for (i = 0; i < LIST_OPTION_BINDINGS.length && !found; i++) {
+                var attribute = [LIST_OPTION_BINDINGS[i], 'data-' + LIST_OPTION_BINDINGS[i]].filter(function (name) {
+                    return widget.hasAttribute(name);
+                })[0];
+
+                if (attribute) {
+                    candidate = $widget.scope().$eval(widget.getAttribute(attribute));
+                    found = true;
+                } else if (isolate && isolate.hasOwnProperty(LIST_OPTION_BINDINGS[i])) {
+                    candidate = isolate[LIST_OPTION_BINDINGS[i]];
+                    found = true;
+                }
+            }
+
+            if (!found) throw new Error('the options binding of the list widget is not found');
+
+            if (Array.isArray(candidate)) {
+                if (candidate.every(function (option) { return optionText(option) !== null; })) return candidate;
+            } else if (candidate && typeof candidate === 'object' &&
+                       Object.keys(candidate).every(function (key) { return typeof candidate[key] === 'string'; })) {
+                return Object.keys(candidate).map(function (key) { return {k: key, v: candidate[key]}; });
+            }
+
+            throw new Error('the options of the list widget are not a list of items');
+        }
+
+        function findWidget(locator, selector) {
+            var found = find(locator[1], locator[0]).filter(isVisible).concat(find(locator[1], locator[0]));
+
+            return found.length ? found[0].closest(selector) : null;
+        }
+
+        // selects an item of a 'list' widget through its ng-model, then waits for the app to settle
+        function selectListItem(locator, text, mode, done) {
+            try {
+                var widget = findWidget(locator, 'list');
+
+                if (!widget || !window.angular) return done('no list widget found');
+
+                var $widget = angular.element(widget), ngModel = $widget.controller('ngModel');
+
+                if (!ngModel) return done('the list widget has no ng-model');
+
+                var options = findOptions($widget), option;
+
+                for (var i = 0; i < options.length; i++) {
+                    if (matches(normalize(optionText(options[i])), normalize(text), mode)) {
+                        option = options[i];
+                        break;
+                    }
+                }
+
+                if (option === undefined) return done('no option of the list widget matches ' + text);
+
+                // the model holds either the option itself or its key
+                var selected = ngModel.$modelValue && typeof ngModel.$modelValue === 'object' ? option : optionValue(option);
+
+                $widget.scope().$apply(function () {
+                    ngModel.$setViewValue(selected);
+                    ngModel.$render();
+                });
+
+                waitForAngular(function () { done(null); });
+            } catch (e) {
+                done(String(e));
+            }
+        }
+
+        // selects an option of a select2 drop-down through its jQuery API, then waits for the app to settle
+        function selectSelect2Item(locator, text, mode, done) {
+            try {
+                var container = findWidget(locator, '.select2-container'), select = null;
+
+                if (!container || !window.jQuery) return done('no select2 widget found');
+
+                // select2 hides the original select next to its container
+                [container.nextElementSibling, container.previousElementSibling].forEach(function (sibling) {
+                    if (!select && sibling && sibling.tagName === 'SELECT' && jQuery(sibling).data('select2')) select = sibling;
+                });
+
+                if (!select) return done('the select2 widget has no select element');
+
+                for (var i = 0; i < select.options.length; i++) {
+                    if (matches(normalize(select.options[i].text), normalize(text), mode)) {
+                        jQuery(select).val(select.options[i].value).trigger('change');
+                        return waitForAngular(function () { done(null); });
+                    }
+                }
+
+                done('no option of the select2 widget matches ' + text);
+            } catch (e) {
+                done(String(e));
+            }
+        }
+
+        // a jQuery UI datepicker's input (or inline element): the located one, else the one whose pop up is or
+        // was last open, the focused one, or the only one displayed
+        function findDatepicker(locator) {
+            if (locator) return find(locator[1], locator[0])[0] || null;
+            if (!window.jQuery || !jQuery.datepicker) return null;
+
+            var instance = jQuery.datepicker._curInst;
+            if (instance && instance.input && instance.input[0]) return instance.input[0];
+
+            if (document.activeElement && jQuery(document.activeElement).hasClass('hasDatepicker')) {
+                return document.activeElement;
+            }
+
+            var displayed = find('css selector', '.hasDatepicker').filter(isVisible);
+            return displayed.length === 1 ? displayed[0] : null;
+        }
+
+        function getDatepickerText(locator) {
+            var target = findDatepicker(locator);
+
+            return target ? datepickerText(target) : null;
+        }
+
+        function datepickerText(target) {
+            if (target.tagName === 'INPUT') return target.value;
+
+            var date = jQuery(target).datepicker('getDate');
+            return date ? jQuery.datepicker.formatDate(jQuery(target).datepicker('option', 'dateFormat'), date) : null;
+        }
+
+        // sets the date with the datepicker's setDate, then notifies the bound model as a selection in the pop up
+        // would (onSelect, input and change events) and waits for the app to settle
+        function setDatepickerDate(locator, year, month, day, done) {
+            try {
+                var target = findDatepicker(locator);
+
+                if (!target || !window.jQuery || !jQuery.datepicker || !jQuery(target).hasClass('hasDatepicker')) {
+                    return done({error: 'no datepicker found', value: null});
+                }
+
+                var $target = jQuery(target);
+
+                $target.datepicker('setDate', new Date(year, month - 1, day));
+
+                var onSelect = $target.datepicker('option', 'onSelect');
+                if (onSelect) onSelect.call(target, datepickerText(target), jQuery.data(target, 'datepicker'));
+
+                if (target.tagName === 'INPUT') {
+                    target.dispatchEvent(new Event('input', {bubbles: true}));
+                    target.dispatchEvent(new Event('change', {bubbles: true}));
+                    $target.datepicker('hide');
+                }
+
+                waitForAngular(function () { done({error: null, value: datepickerText(target)}); });
+            } catch (e) {
+                done({error: String(e), value: null});
+            }
+        }
+
+        function getPageHeight() {
+            return Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0);
+        }
+
+        // scrolls to the bottom, returns whether the page was already there
+        function scrollToBottom() {
+            var reached = Math.ceil(window.pageYOffset + window.innerHeight) >= getPageHeight();
+
+            window.scrollTo(0, getPageHeight());
+
+            return reached;
+        }
+
+        // scrolls to the top, returns whether the page was already there
+        function scrollToTop() {
+            var reached = window.pageYOffset <= 0;
+
+            window.scrollTo(0, 0);
+
+            return reached;
+        }
+
+        function scrollBy(distance) {
+            window.scrollBy(0, distance);
+        }
+
+        function scrollIntoView(element, offset) {
+            window.scrollTo(0, element.getBoundingClientRect().top + window.pageYOffset - (offset || 0));
+        }
+
+        return {
+            version: version,
+            find: find,
+            isVisible: isVisible,
+            text: text,
+            read: read,
+            queryStates: queryStates,
+            extract: extract,
+            waitFor: waitFor,
+            waitForAngular: waitForAngular,
+            softGo: softGo,
+            currentRoute: currentRoute,
+            menuTree: menuTree,
+            lookup: lookup,
+            lookupAll: lookupAll,
+            facet: facet,
+            fillForm: fillForm,
+            enterText: enterText,
+            findFirst: findFirst,
+            runActions: runActions,
+            selectListItem: selectListItem,
+            selectSelect2Item: selectSelect2Item,
+            getDatepickerText: getDatepickerText,
+            setDatepickerDate: setDatepickerDate,
+            scrollToBottom: scrollToBottom,
+            scrollToTop: scrollToTop,
+            scrollBy: scrollBy,
+            scrollIntoView: scrollIntoView
+        };
+    })(arguments[0]);
+"""
+
+VERSION = hashlib.sha1(_RUNTIME_JS.encode('utf-8')).hexdigest()[:12]
+
+_MISSING = '__cyan_runtime_missing__'
+
+_CALL_JS = """
+    var cyan = window.__cyan;
+
+    if (!cyan || cyan.version !== arguments[0]) return '%s';
+
+    return cyan[arguments[1]].apply(cyan, arguments[2]);
+""" % _MISSING
+
+_CALL_ASYNC_JS = """
+    var cyan = window.__cyan, done = arguments[arguments.length - 1];
+
+    if (!cyan || cyan.version !== arguments[0]) return done('%s');
+
+    cyan[arguments[1]].apply(cyan, arguments[2].concat([done]));
+""" % _MISSING
+
+
+def call(name: str, *args):
+    """
+    Call a function of the runtime, injecting the runtime first if the page doesn't have it.
+
+    :param name: The function name
+    :param args: The function's arguments, WebElements are passed as DOM elements
+    :return: The function's result
+    """
+    result = execute(_CALL_JS, VERSION, name, list(args))
+
+    if result == _MISSING:
+        result = execute(_RUNTIME_JS + _CALL_JS, VERSION, name, list(args))
+
+    return result
+
+
+def call_async(name: str, *args, timeout: float = 30):
+    """
+    Call an asynchronous function of the runtime, it signals its completion by calling its last argument.
+
+    :param name: The function name
+    :param args: The function's arguments, the completion callback is added to them
+    :param timeout: Seconds the driver waits for the function to complete
+    :return: The value the function completed with
+    """
+    set_script_timeout(common.get_browser(), timeout)
+    result = execute(_CALL_ASYNC_JS, VERSION, name, list(args), asynchronous=True)
+
+    if result == _MISSING:
+        result = execute(_RUNTIME_JS + _CALL_ASYNC_JS, VERSION, name, list(args), asynchronous=True)
+
+    return result
+
+
+def execute(script: str, *args, asynchronous: bool = False):
+    """
+    Run a script. If one of its element arguments went stale and it comes from the locator cache (see
+    dom.CachedElement), its locator is found again and the script is run again.
+
+    :param script: The script to run
+    :param args: The script's arguments, the elements may be nested in lists
+    :param asynchronous: Whether the script signals its completion by calling its last argument
+    :return: The script's result
+    """
+    browser = common.get_browser()
+    run = browser.execute_async_script if asynchronous else browser.execute_script
+
+    try:
+        return run(script, *args)
+    except StaleElementReferenceException:
+        elements = [arg for arg in _flatten(args) if hasattr(arg, 'refresh')]
+
+        if not elements:
+            raise
+
+        for element in elements:
+            element.refresh()
+
+        return run(script, *args)
+
+
+def _flatten(args):
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            yield from _flatten(arg)
+        else:
+            yield arg
+
+
+def set_script_timeout(browser, timeout: float):
+    # setting the timeout is a round trip of its own, only do it when it changes
+    if getattr(browser, 'cyan_script_timeout', None) != timeout:
+        browser.set_script_timeout(timeout)
+        browser.cyan_script_timeout = timeout
@@ -1,74 +1,100 @@
 from http.client import CannotSendRequest
+import hashlib
+import json
 import os
-import configparser
+import time
 
 from selenium.webdriver.support import expected_conditions as ec
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.wait import WebDriverWait
 
-from . import common
+from . import common, config
 
 
 def init_class(config_path: str=''):
-    config_file = config_path or get_config_path()
-    config = configparser.ConfigParser()
+    common.set_browser(create_browser(config_path))
 
-    config.read(config_file)
 
-    site = config['SITE']['SiteUrl'] or r'http://localhost/'
-    connection_string = config['SITE']['ConnectionString'] or r"Driver={SQL Server Native Client 11.0}; " \
-                                                              "Server=.; Database=cosacs;uid=sa;pwd=;"
-    driver_path = config['SITE']['DriverRelPath'] or r'\drivers\chromedriver.exe'
-    use_remote = config['SELENIUM']['UseHub'] or False
+def create_browser(config_path: str=''):
+    """
+    Launch a new web driver as configured in the settings file.
+
+    :param config_path: The settings file path, defaults to the project's settings.ini
+    :return: The new web driver
+    """
+    settings = config.get_config(config_path)
+
+    common.site_url = settings.site_url
+    common.driver_path = settings.driver_path
+    common.connection_string = settings.connection_string
+    common.keep_browser = settings.keep_browser
+    common.recycle_after = settings.recycle_after
+    common.reset_storage = settings.reset_storage
+    common.session_snapshot = settings.session_snapshot
+    common.health_ttl = settings.health_ttl
+
+    if settings.use_daemon:
+        # imported here as the daemon module builds on this one
+        from . import daemon
+
+        return daemon.attach(settings.daemon_url)
+
+    return create_local_browser(config_path)
 
-    common.site_url = site
-    common.driver_path = get_driver_path(driver_path)
-    common.connection_string = connection_string
 
-    if use_remote == 'True':
-        hub_ip = config['SELENIUM']['HubIp'] or '192.168.30.8'
-        hub_port = config['SELENIUM']['HubPort'] or '4444'
-        hub_url = 'http://%s:%s/wd/hub' % (hub_ip, hub_port)
+def create_local_browser(config_path: str=''):
+    """
+    Launch a new web driver, on the hub or locally as configured in the settings file, but never
+    borrowed from the daemon. The daemon launches its own browsers with it.
+
+    :param config_path: The settings file path, defaults to the project's settings.ini
+    :return: The new web driver
+    """
+    settings = config.get_config(config_path)
+    common.driver_path = settings.driver_path
 
-        print('using hub at: %s' % hub_url)
+    if settings.use_hub:
+        print('using hub at: %s' % settings.hub_url)
 
         desired_caps = {'platform': 'WINDOWS', 'browserName': 'chrome'}
-        common.browser = webdriver.Remote(hub_url, desired_caps)
+        driver = webdriver.Remote(settings.hub_url, desired_caps)
     else:
-        common.browser = webdriver.Chrome(common.driver_path)
+        driver = webdriver.Chrome(common.driver_path)
 
-    common.browser.maximize_window()
+    driver.maximize_window()
 
+    return driver
 
-def get_config_path():
-    dir_path = get_project_path()
 
-    return dir_path + r"\settings.ini"
+def get_config_path():
+    return config.get_config_path()
 
 
 def get_driver_path(driver_name: str):
-    dir_path = get_project_path()
-
-    return dir_path + driver_name
+    return config.get_driver_path(driver_name)
 
 
 def get_project_path():
-    path = os.path.abspath(__file__)
-
-    return os.path.dirname(path).replace('\cyan\cyan', '')
+    return config.get_project_path()
 
 
 def check_self(check_logging: bool=True):
     # global checking
 
-    if common.checking:
+    batch = common.get_session().batch
+
+    if batch is not None and batch.actions:
+        # a helper that isn't recorded by input.batch is a synchronization point
+        batch.flush()
+
+    if common.get_session().checking:
         return
     else:
-        common.checking = True
-        if common.browser is None:
+        common.get_session().checking = True
+        if common.get_browser() is None:
             init_class()
 
         if check_logging and is_logged() is False:
@@ -89,36 +115,107 @@ def login(user: str=None, password: str=None, config_path: str=''):
     if is_logged():
         return
     else:
-        config_file = config_path or get_config_path()
-        config = configparser.ConfigParser()
-
-        config.read(config_file)
-
-        default_user = config['SITE']['User'] or r"user"
-        default_pw = config['SITE']['Pw'] or r"password"
+        u, pw = get_credentials(user, password, config_path)
 
-        u = user or default_user
-        pw = password or default_pw
+        if common.session_snapshot and restore_session_snapshot(u):
+            return
 
-        common.browser.get(common.site_url)
+        common.get_session().invalidate()
+        common.get_browser().get(common.site_url)
         __wait_element_presence("#username")
 
-        username_txt = common.browser.find_element(By.ID, r"username")
+        username_txt = common.get_browser().find_element(By.ID, r"username")
         __is_valid_element(username_txt)
         username_txt.send_keys(u)
 
-        password_txt = common.browser.find_element(By.ID, r"password")
+        password_txt = common.get_browser().find_element(By.ID, r"password")
         __is_valid_element(password_txt)
         password_txt.send_keys(pw)
 
         xpath = "//button[contains(.,'Log In')]"
-        login_btn = common.browser.find_element(By.XPATH, xpath)
+        login_btn = common.get_browser().find_element(By.XPATH, xpath)
         __is_valid_element(login_btn)
         login_btn.click()
 
         __wait_element_presence("logoff", By.ID, 40)
         __wait_element_presence("Warranty", By.LINK_TEXT, 10)
 
+        common.get_session().user = u
+        common.get_session().health.set('logged', True)
+
+        if common.session_snapshot:
+            save_session_snapshot(u)
+
+
+def login_fast(user: str=None, password: str=None, config_path: str=''):
+    """
+    Log in into Cosacs application without the login form: the credentials are posted straight to the
+    authentication endpoint (AuthUrl in the SITE section) and the returned cookies are set into the
+    browser, which then opens the site already authenticated.
+
+    :param user: User name
+    :param password: Password
+    :param config_path: The settings file path, defaults to the project's settings.ini
+    """
+    check_self(False)
+
+    u, pw = get_credentials(user, password, config_path)
+
+    if common.get_session().user == u and is_logged():
+        return
+
+    # requests is only needed here, it's imported on first use to keep 'import cyan' fast
+    import requests
+
+    settings = config.get_config(config_path)
+    auth_url = settings.auth_url
+
+    http = requests.Session()
+    response = http.post(auth_url, data={settings.auth_user_field: u, settings.auth_password_field: pw},
+                         timeout=30)
+    response.raise_for_status()
+
+    assert len(http.cookies) > 0, "The authentication endpoint '%s' didn't return any cookie" % auth_url
+
+    browser = common.get_browser()
+
+    # cookies can only be set for the domain of the page the browser is on
+    common.get_session().invalidate()
+    browser.get(common.site_url)
+    browser.delete_all_cookies()
+
+    for cookie in http.cookies:
+        browser_cookie = {'name': cookie.name, 'value': cookie.value, 'path': cookie.path or '/',
+                          'secure': bool(cookie.secure)}
+
+        if cookie.expires:
+            browser_cookie['expiry'] = cookie.expires
+
+        browser.add_cookie(browser_cookie)
+
+    browser.get(common.site_url)
+    __wait_element_presence("logoff", By.ID, 40)
+
+    common.get_session().user = u
+    common.get_session().health.set('logged', True)
+
+    if common.session_snapshot:
+        save_session_snapshot(u)
+
+
+def get_credentials(user: str=None, password: str=None, config_path: str=''):
+    """
+    Get the user name and password to log in with, the defaults come from the settings file.
+
+    :param user: User name
+    :param password: Password
+    :param config_path: The settings file path, defaults to the project's settings.ini
+    :return: The user name and password
+    """
+    settings = config.get_config(config_path)
+
+    return user or settings.user, password or settings.password
+
 
 def logout():
     """
@@ -126,24 +223,181 @@ def logout():
     """
     check_self()
 
-    logoff_btn = common.browser.find_element(By.ID, r"logoff")
+    if common.get_session().user:
+        delete_session_snapshot(common.get_session().user)
+        common.get_session().user = None
+
+    logoff_btn = common.get_browser().find_element(By.ID, r"logoff")
     __is_valid_element(logoff_btn)
     logoff_btn.click()
     __wait_element_presence("#username")
 
+    common.get_session().health.set('logged', False)
+
 
 def is_logged():
+    """
+    Check if the current browser is logged in. The state is probed at most once per common.health_ttl
+    seconds, navigation and driver errors make it probed again.
+    """
+    if common.get_browser() is None:
+        return False
+
+    health = common.get_session().health
+    logged = health.get('logged')
+
+    if logged is not None:
+        return logged
+
     try:
-        if common.browser is None or __is_all_windows_closed():
+        if not is_alive():
             return False
         else:
-            logoff_btn = common.browser.find_element(By.ID, r"logoff")
-            return logoff_btn is not None
+            logoff_btn = common.get_browser().find_element(By.ID, r"logoff")
+            logged = logoff_btn is not None
     except NoSuchElementException:
+        logged = False
+    except (ConnectionRefusedError, WebDriverException):
+        health.invalidate()
         return False
-    except ConnectionRefusedError:
+
+    return health.set('logged', logged)
+
+
+def is_alive() -> bool:
+    """
+    Check if the current browser is still open, the state is cached like is_logged's.
+    """
+    health = common.get_session().health
+    alive = health.get('alive')
+
+    if alive is None:
+        alive = health.set('alive', not __is_all_windows_closed())
+
+    return alive
+
+
+def get_snapshot_path(user: str) -> str:
+    """
+    Get the session snapshot file of a user on the current site.
+
+    :param user: User name
+    :return: The snapshot file path
+    """
+    key = hashlib.sha1(('%s|%s' % (user, common.site_url)).encode('utf-8')).hexdigest()[:16]
+
+    return os.path.join(get_project_path(), 'sessions', '%s.json' % key)
+
+
+def save_session_snapshot(user: str):
+    """
+    Save the cookies and web storage of the current (logged in) browser, so other browsers, in this
+    process or another, can restore the session instead of logging in again.
+
+    :param user: User name the session belongs to
+    """
+    browser = common.get_browser()
+    snapshot = {
+        'site': common.site_url,
+        'user': user,
+        'cookies': browser.get_cookies(),
+        'storage': browser.execute_script(__GET_STORAGE_JS),
+    }
+
+    path = get_snapshot_path(user)
+    # the snapshot holds the authenticated cookies
+    config.make_private_dir(os.path.dirname(path))
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+
+    with config.open_private(temp_path) as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+
+    os.replace(temp_path, path)
+
+
+def restore_session_snapshot(user: str) -> bool:
+    """
+    Restore a saved session into the current browser. The snapshot is deleted if it has expired or the
+    server rejects it.
+
+    :param user: User name
+    :return: True if the browser is logged in with the restored session
+    """
+    path = get_snapshot_path(user)
+
+    try:
+        with open(path, 'r') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return False
+
+    browser = common.get_browser()
+    now = time.time()
+    cookies = snapshot.get('cookies') or []
+
+    if any(cookie.get('expiry', now + 1) <= now for cookie in cookies):
+        delete_session_snapshot(user)
+        return False
+
+    try:
+        # cookies can only be set for the domain of the page the browser is on
+        common.get_session().invalidate()
+        browser.get(common.site_url)
+
+        for cookie in cookies:
+            browser.add_cookie(dict((key, value) for key, value in cookie.items() if key in __COOKIE_KEYS))
+
+        browser.execute_script(__SET_STORAGE_JS, snapshot.get('storage') or {})
+        browser.get(common.site_url)
+
+        WebDriverWait(browser, timeout=30).until(
+            lambda s: s.find_elements(By.ID, r"logoff") or s.find_elements(By.ID, r"username"))
+
+        if not browser.find_elements(By.ID, r"logoff"):
+            delete_session_snapshot(user)
+            return False
+
+        __wait_element_presence("Warranty", By.LINK_TEXT, 10)
+    except (TimeoutException, WebDriverException):
+        delete_session_snapshot(user)
         return False
 
+    common.get_session().user = user
+    common.get_session().health.set('logged', True)
+
+    return True
+
+
+def delete_session_snapshot(user: str):
+    try:
+        os.remove(get_snapshot_path(user))
+    except OSError:
+        pass
+
+
+__COOKIE_KEYS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry')
+
+__GET_STORAGE_JS = """
+    function read(storage) {
+        var values = {};
+        for (var i = 0; i < storage.length; i++) {
+            values[storage.key(i)] = storage.getItem(storage.key(i));
+        }
+        return values;
+    }
+    return {local: read(window.localStorage), session: read(window.sessionStorage)};
+"""
+
+__SET_STORAGE_JS = """
+    function write(storage, values) {
+        for (var key in values) {
+            storage.setItem(key, values[key]);
+        }
+    }
+    write(window.localStorage, arguments[0].local || {});
+    write(window.sessionStorage, arguments[0].session || {});
+"""
+
 
 def __is_valid_element(element: WebElement):
     assert (element is not None)
@@ -154,15 +408,15 @@ def __is_valid_element(element: WebElement):
 def __is_all_windows_closed() -> bool:
     # global browser
 
-    if common.browser is None:
+    if common.get_browser() is None:
         return True
     else:
         try:
-            handles = common.browser.window_handles
+            handles = common.get_browser().window_handles
 
             return handles is None or len(handles) < 1
         except CannotSendRequest:
-            common.browser = None
+            common.set_browser(None)
             return True
 
 
@@ -174,13 +428,13 @@ def __wait_element_presence(search_filter, by: By=By.CSS_SELECTOR, timer: int=30
     :param timer: time to wait before it through a timeout error
     :param by: element filter type
     """
-    WebDriverWait(common.browser, timeout=timer).until(
+    WebDriverWait(common.get_browser(), timeout=timer).until(
         ec.presence_of_element_located((by, search_filter))
     )
 
 
 def __sys_admin_page():
-    sysadmin_btn = common.browser.find_element(By.ID, r"profile")
+    sysadmin_btn = common.get_browser().find_element(By.ID, r"profile")
     __is_valid_element(sysadmin_btn)
     sysadmin_btn.click()
 
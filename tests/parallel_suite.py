@@ -0,0 +1,17 @@
+import unittest
+
+
+# test classes run by test_runner in the worker processes, kept out of the discovered test modules
+
+
+class FirstSample(unittest.TestCase):
+    def test_one(self):
+        self.assertTrue(True)
+
+    def test_two(self):
+        self.assertEqual(1 + 1, 2)
+
+
+class SecondSample(unittest.TestCase):
+    def test_three(self):
+        self.assertIn('a', 'abc')
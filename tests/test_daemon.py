@@ -0,0 +1,71 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+import unittest
+
+from cyan import daemon
+
+
+class _StubExecutorHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        self.requests.append((self.command, self.path, json.loads(body) if body else None))
+
+        if self.path == '/session/lent-session/url':
+            values = {'value': 'http://stub/page'}
+        elif self.path == '/release':
+            values = {'released': True}
+        else:
+            values = {'value': {'error': 'unknown command', 'message': self.path}}
+
+        reply = json.dumps(values).encode('utf-8')
+        self.send_response(200 if 'error' not in values.get('value', {}) else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AttachedDriverTest(unittest.TestCase):
+    def setUp(self):
+        _StubExecutorHandler.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), _StubExecutorHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_runs_commands_on_the_lent_session(self):
+        driver = daemon.AttachedDriver(self.url, self.url, 'lent-session', {'browserName': 'chrome'}, True)
+
+        self.assertEqual(driver.capabilities, {'browserName': 'chrome'})
+        self.assertTrue(driver.w3c)
+        self.assertEqual(driver.current_url, 'http://stub/page')
+        # attaching doesn't create a session
+        self.assertEqual([(method, path) for method, path, _ in _StubExecutorHandler.requests],
+                         [('GET', '/session/lent-session/url')])
+
+    def test_quit_hands_the_session_back(self):
+        driver = daemon.AttachedDriver(self.url, self.url, 'lent-session')
+        driver.quit(healthy=False)
+
+        self.assertEqual(_StubExecutorHandler.requests[-1],
+                         ('POST', '/release', {'session_id': 'lent-session', 'healthy': False}))
+
+
+if __name__ == '__main__':
+    unittest.main()
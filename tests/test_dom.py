@@ -0,0 +1,52 @@
+from unittest import mock
+import unittest
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+
+from cyan import common, config, dom, input
+
+
+class LocatorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_patch = mock.patch.object(config.CyanConfig, 'locator_cache', new_callable=mock.PropertyMock,
+                                             return_value=True)
+        self.cache_patch.start()
+
+        self.browser = mock.Mock()
+        self.browser.find_element.side_effect = lambda by, value: WebElement(self.browser, 'element-%d' %
+                                                                            self.browser.find_element.call_count)
+        self.session = common.Session(self.browser)
+        self.session.checking = True
+        common.bind_session(self.session)
+
+    def tearDown(self):
+        common.bind_session(None)
+        self.cache_patch.stop()
+
+    def test_repeated_lookups_cost_no_browser_call(self):
+        elements = [dom.get_element('#a') for _ in range(3)]
+
+        self.assertEqual(self.browser.find_element.call_count, 1)
+        self.assertEqual(self.browser.execute.call_count, 0)
+        self.assertEqual(self.browser.execute_script.call_count, 0)
+        self.assertTrue(all(element is elements[0] for element in elements))
+
+    def test_click_clears_the_cache(self):
+        input.click_on_element(dom.get_element('#a'))
+        dom.get_element('#a')
+
+        self.assertEqual(self.browser.find_element.call_count, 2)
+
+    def test_stale_element_is_found_again(self):
+        element = dom.get_element('#a')
+        self.browser.execute.side_effect = [StaleElementReferenceException('stale'), {'value': 'text'}]
+
+        self.assertEqual(element.text, 'text')
+        self.assertEqual(self.browser.find_element.call_args_list[-1], mock.call(By.CSS_SELECTOR, '#a'))
+        self.assertEqual(element.id, 'element-2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from unittest import mock
+import unittest
+
+from cyan import common, config, input
+
+
+class _FakePage(object):
+    """
+    A page whose '#next' button replaces the form, as a route change would. runActions follows the runtime's
+    contract: the actions run in order and a call ends after a click.
+    """
+
+    def __init__(self):
+        self.form = {'#first': '', '#next': None}
+        self.forms = [self.form]
+        self.calls = []
+
+    def call(self, name, actions, mode, threshold):
+        self.calls.append(name)
+
+        for index, (action, locator, text, keys) in enumerate(actions):
+            if locator[0] not in self.form:
+                return {'index': index, 'error': 'element not found', 'element': None}
+
+            if action == 'click':
+                self.form = {'#second': ''}
+                self.forms.append(self.form)
+                return {'index': index, 'error': None, 'element': None, 'clicked': True}
+
+            self.form[locator[0]] += text
+
+        return None
+
+    def wait_for_angular(self, *args, **kwargs):
+        self.calls.append('wait_for_angular')
+        return True
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.page = _FakePage()
+        self.patches = [
+            mock.patch.object(config.CyanConfig, 'text_entry', new_callable=mock.PropertyMock, return_value='paste'),
+            mock.patch.object(input.runtime, 'call', self.page.call),
+            mock.patch.object(input.dom, 'wait_for_angular', self.page.wait_for_angular),
+        ]
+
+        for patch in self.patches:
+            patch.start()
+
+        self.session = common.Session(mock.Mock())
+        self.session.checking = True
+        common.bind_session(self.session)
+
+    def tearDown(self):
+        common.bind_session(None)
+
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def test_actions_after_a_click_run_on_the_replaced_form(self):
+        with input.batch():
+            input.write_on_textbox('John', '#first')
+            input.click_element('#next')
+            input.write_on_textbox('Smith', '#second')
+
+        self.assertEqual(self.page.calls, ['runActions', 'wait_for_angular', 'runActions'])
+        self.assertEqual(self.page.forms, [{'#first': 'John', '#next': None}, {'#second': 'Smith'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
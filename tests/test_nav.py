@@ -0,0 +1,43 @@
+from unittest import mock
+import unittest
+
+from cyan import common, nav
+
+
+class GoTest(unittest.TestCase):
+    def setUp(self):
+        self.site_url_patch = mock.patch.object(common, 'site_url', 'http://site/app/')
+        self.site_url_patch.start()
+
+        self.browser = mock.Mock()
+        self.session = common.Session(self.browser)
+        self.session.checking = True
+        common.bind_session(self.session)
+
+    def tearDown(self):
+        common.bind_session(None)
+        self.site_url_patch.stop()
+
+    def test_relative_url_is_prefixed_with_the_site_url(self):
+        nav.go('Sales/#/orders', soft=False)
+
+        self.browser.get.assert_called_once_with('http://site/app/Sales/#/orders')
+
+    def test_absolute_url_is_gone_to_as_it_is(self):
+        nav.go('https://reports.site/#/sales', soft=False)
+
+        self.browser.get.assert_called_once_with('https://reports.site/#/sales')
+
+    def test_soft_navigation_falls_back_to_a_reload(self):
+        self.browser.current_url = 'http://site/app/Sales/#/orders'
+
+        with mock.patch.object(nav.runtime, 'call_async',
+                               return_value='AngularJS is not running on the page') as call_async:
+            nav.go('Sales/#/customers', soft=True)
+
+        call_async.assert_called_once_with('softGo', '/customers', 3.0, timeout=4.0)
+        self.browser.get.assert_called_once_with('http://site/app/Sales/#/customers')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+from unittest import mock
+import unittest
+
+from cyan import BaseTestCase, common, pool
+
+
+class PoolLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = pool.BrowserPool(1, mock.Mock).start()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_browser_is_released_when_set_up_fails(self):
+        class FailingSetUp(BaseTestCase.BaseTestCase):
+            browser_pool = self.pool
+
+            def setUp(self):
+                super(FailingSetUp, self).setUp()
+                raise RuntimeError('set up failed')
+
+            def test_nothing(self):
+                pass
+
+        result = unittest.TestResult()
+        FailingSetUp('test_nothing').run(result)
+
+        self.assertEqual(len(result.errors), 1)
+        self.assertIsNotNone(self.pool.acquire(timeout=0))
+
+    def test_release_resets_the_test_state(self):
+        with self.pool.lease() as session:
+            session.checking = True
+            session.locators[('css selector', '#a')] = mock.Mock()
+            session.menus['main'] = []
+            session.health.set('logged', True)
+
+        session = self.pool.acquire(timeout=0)
+
+        self.assertFalse(session.checking)
+        self.assertEqual(session.locators, {})
+        self.assertEqual(session.menus, {})
+        self.assertIsNone(session.health.get('logged'))
+
+
+if __name__ == '__main__':
+    unittest.main()
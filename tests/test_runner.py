@@ -0,0 +1,52 @@
+from unittest import mock
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from cyan import cyanTestRunner
+
+import parallel_suite
+
+
+class RunParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        # the runner relays the workers' output to stdout, which has a byte buffer
+        self.stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        self.stdout_patch = mock.patch.object(sys, 'stdout', self.stdout)
+        self.stdout_patch.start()
+
+    def tearDown(self):
+        self.stdout_patch.stop()
+        self.folder.cleanup()
+
+    def test_runs_test_classes_on_workers(self):
+        suite = unittest.defaultTestLoader.loadTestsFromModule(parallel_suite)
+        runner = cyanTestRunner.CyanTestRunner(stream=io.StringIO(), workers=2,
+                                               durations_file=os.path.join(self.folder.name, 'durations.json'))
+
+        result = runner.run_parallel(suite)
+
+        self.stdout.flush()
+        output = self.stdout.buffer.getvalue().decode('utf-8')
+        test_ids = [test.id() for test in cyanTestRunner._iter_tests(suite)]
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(sorted(result.durations), sorted(test_ids))
+
+        lines = output.splitlines()
+        finished = [line for line in lines if line.startswith('##teamcity[testFinished')]
+        self.assertEqual(sorted(test_id for test_id in test_ids for line in finished if "name='%s'" % test_id in line),
+                         sorted(test_ids))
+
+        # each class's messages are relayed in one piece
+        indexes = [index for index, line in enumerate(lines) if 'FirstSample' in line]
+        self.assertEqual(len(indexes), 4)
+        self.assertEqual(indexes, list(range(indexes[0], indexes[0] + 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
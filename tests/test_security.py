@@ -0,0 +1,108 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+import os
+import stat
+import tempfile
+import threading
+import unittest
+
+from cyan import common, config, security
+
+
+class _StubAuthHandler(BaseHTTPRequestHandler):
+    posted = []
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.posted.append((self.path, parse_qs(self.rfile.read(length).decode('utf-8'))))
+
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'ASP.NET_SessionId=stub-session; Path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LoginFastTest(unittest.TestCase):
+    def setUp(self):
+        _StubAuthHandler.posted = []
+        self.server = HTTPServer(('127.0.0.1', 0), _StubAuthHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.site_url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.environ = mock.patch.dict(os.environ, {'CYAN_SITE_AUTHURL': self.site_url + 'Account/Login',
+                                                    'CYAN_SITE_SITEURL': self.site_url})
+        self.environ.start()
+        self.site_url_patch = mock.patch.object(common, 'site_url', self.site_url)
+        self.site_url_patch.start()
+        # the snapshot would be written to the project's folder
+        self.snapshot_patch = mock.patch.object(common, 'session_snapshot', False)
+        self.snapshot_patch.start()
+
+        self.browser = mock.Mock()
+        self.session = common.Session(self.browser)
+        self.session.checking = True
+        common.bind_session(self.session)
+
+    def tearDown(self):
+        common.bind_session(None)
+        self.snapshot_patch.stop()
+        self.site_url_patch.stop()
+        self.environ.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_posts_credentials_and_sets_cookies(self):
+        security.login_fast('stub-user', 'stub-password')
+
+        self.assertEqual(len(_StubAuthHandler.posted), 1)
+        path, form = _StubAuthHandler.posted[0]
+        settings = config.get_config()
+        self.assertEqual(path, '/Account/Login')
+        self.assertEqual(form[settings.auth_user_field], ['stub-user'])
+        self.assertEqual(form[settings.auth_password_field], ['stub-password'])
+
+        cookies = [call[0][0] for call in self.browser.add_cookie.call_args_list]
+        self.assertEqual([(cookie['name'], cookie['value']) for cookie in cookies],
+                         [('ASP.NET_SessionId', 'stub-session')])
+        self.browser.delete_all_cookies.assert_called_once_with()
+        self.browser.get.assert_called_with(self.site_url)
+
+        self.assertEqual(self.session.user, 'stub-user')
+        self.assertTrue(self.session.health.get('logged'))
+
+
+class SessionSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.environ = mock.patch.dict(os.environ, {'CYAN_PROJECT_PATH': self.folder.name})
+        self.environ.start()
+
+        self.browser = mock.Mock()
+        self.browser.get_cookies.return_value = [{'name': 'ASP.NET_SessionId', 'value': 'secret'}]
+        self.browser.execute_script.return_value = {}
+        common.bind_session(common.Session(self.browser))
+
+    def tearDown(self):
+        common.bind_session(None)
+        self.environ.stop()
+        self.folder.cleanup()
+
+    def test_snapshots_are_off_by_default(self):
+        self.assertFalse(common.session_snapshot)
+
+    def test_snapshot_is_private_and_ignored(self):
+        security.save_session_snapshot('stub-user')
+        path = security.get_snapshot_path('stub-user')
+
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+        with open(os.path.join(os.path.dirname(path), '.gitignore')) as ignore:
+            self.assertEqual(ignore.read(), '*\n')
+
+
+if __name__ == '__main__':
+    unittest.main()